@@ -1,19 +1,49 @@
 import time
 import cv2
 import numpy as np
-from utils import find_angle, find_dist, get_landmark_features, draw_text, draw_dotted_line, get_visibility
-from pygame import mixer
+from utils import find_angles, find_dist, draw_dotted_line, get_visibility, \
+    NUM_LANDMARKS, PoseResult, get_landmark_buffer, scale_landmarks
+from audio import get_player
+from overlay import LabelCache, HudLayer, static_label
+from metrics import FrameMetrics
+from adaptive import FrameSkipper
+from state import StateTracker, SEQ_EMPTY, SEQ_S2, SEQ_COMPLETE
+from tracks import TrackRecorder
+from models import mark
+from smoothing import make_filter
 import math
 
 
 class Activity:
-    def __init__(self, settings, flip_frame=False):
+    def __init__(self, settings, flip_frame=False, mute=False, audio=None, clock=time.perf_counter,
+                 target_fps=None, max_skip=4, max_angular_speed=360.0, record=False, analysis_width=None,
+                 smoothing=None):
 
         # Set if frame should be flipped or not.
         self.flip_frame = flip_frame
 
+        # Offline analysis has nobody to talk to.
+        self.mute = mute
+
+        # AudioCuePlayer for the cues; the process-wide one unless given.
+        # It is started now, so the cue files are decoded before the first
+        # rep instead of delaying its cue.
+        self.audio = audio
+        if not mute:
+            if self.audio is None:
+                self.audio = get_player()
+            self.audio.start()
+
         self.settings = settings
 
+        # Seconds source for frames that come without a timestamp. Offline
+        # callers pass each frame's presentation time instead, so inactivity
+        # and FPS follow the clip rather than how fast it is processed.
+        self.clock = clock
+
+        # Time of the frame being analyzed, None before the first one.
+        self.now = None
+
         # Font type.
         self.font = cv2.FONT_HERSHEY_SIMPLEX
 
@@ -23,8 +53,16 @@ class Activity:
         # set radius to draw arc
         self.radius = 20
 
-        self.prev_frame_time = 0
-        self.new_frame_time = 0
+        # HUD labels are rasterized once and pasted on later frames.
+        self.labels = LabelCache()
+
+        # Feedback panels, banners and the stage box look the same from frame
+        # to frame and are composited as one cached layer.
+        self.hud = HudLayer()
+
+        # FPS and per-stage latencies, see metrics.FrameMetrics.
+        self.metrics = FrameMetrics()
+        self._stage_start = 0.0
 
         # Colors in RGB format.
         self.COLORS = {
@@ -69,1250 +107,804 @@ class Activity:
 
         self.feedback_count = len(self.settings['FEEDBACK_ID_MAP'])
 
+        # Landmark buffers reused every frame: normalized (x, y, z, visibility)
+        # and the truncated pixel coordinates the geometry works on.
+        self.landmarks = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        self.landmark_coords = np.zeros((NUM_LANDMARKS, 2), dtype=np.int64)
+        self._probe_coords = np.zeros((NUM_LANDMARKS, 2), dtype=np.int64)
+        self._frame_size = np.zeros(2, dtype=np.float64)
+
+        # The exercise described by the settings, compiled once.
+        self.exercise = self._compile_exercise(settings)
+
+        # With a target FPS, process() runs the pose estimator on every k-th
+        # frame only and extrapolates the rest, see adaptive.FrameSkipper.
+        # Extrapolated frames keep the stage of the last detection and
+        # advance the inactivity timers and the feedback panel windows, so
+        # panels stay up for CNT_FRAME_THRESH frames either way. Counters and
+        # fault rules only run on detected frames: a fault's panel is
+        # raised again on the next detection, not on every frame.
+        self.skipper = None
+        if target_fps:
+            self.skipper = FrameSkipper(
+                self, target_fps, max_skip=max_skip, max_angular_speed=max_angular_speed)
+
+        # With record=True the raw landmarks and timestamp of every analyzed
+        # frame are kept, so the set can be scored again from
+        # `self.recorder.save(path)` without re-running the pose estimator.
+        # Frames the FrameSkipper extrapolated are not pose estimator output
+        # and are left out.
+        self.recorder = TrackRecorder() if record else None
+        self._extrapolated = False
+        self._landmarks_used = None
+
+        # Optional temporal filter over the landmark positions, see
+        # smoothing.py: a name such as 'one_euro', a (name, params) pair or a
+        # filter instance. The recorder keeps the raw landmarks.
+        self.smoother = make_filter(smoothing)
+        self._smoothed = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+
+        # With an analysis width, process() runs the pose estimator on a copy
+        # of the frame downscaled to that width and analyze() works in pixels
+        # of that size, whatever the camera resolution, so angle thresholds
+        # such as OFFSET_THRESH behave the same for a webcam and a 4K camera.
+        # The overlay is still drawn on the full-resolution frame.
+        self.analysis_width = analysis_width
+        self._analysis_frame = None
+        self._display_coords = np.zeros((NUM_LANDMARKS, 2), dtype=np.int64)
+        self._display_size = np.zeros(2, dtype=np.float64)
+
         # For tracking counters and sharing states in and out of callbacks.
-        self.state_tracker = {
-            'state_seq': [],
+        self.state_tracker = StateTracker(self.feedback_count)
+
+    def _compile_exercise(self, settings):
+        # Resolve the joint names, angle names and thresholds of the settings
+        # schema (see settings.py) into indices and numbers up front, so a
+        # frame does nothing but arithmetic and comparisons.
+        angle_names = [angle_def[0] for angle_def in settings['ANGLES']]
+
+        def bound(value, default):
+            if value is None:
+                return default
+            if isinstance(value, str):
+                return settings[value]
+            if isinstance(value, tuple):
+                key, idx = value
+                return settings[key][idx]
+            return value
+
+        faults = settings['FAULTS']
+        rules = []
+        for rule in faults['RULES']:
+            if rule['angle'] not in angle_names:
+                raise ValueError(f"Fault rule uses unknown angle {rule['angle']!r}")
+
+            rules.append((
+                rule['angle'],
+                bound(rule.get('above'), -math.inf),
+                bound(rule.get('below'), math.inf),
+                rule['feedback'],
+                rule.get('incorrect', True),
+                rule.get('sound'),
+                rule.get('seq_count')
+            ))
+
+        if settings['STATE_ANGLE'] not in angle_names:
+            raise ValueError(f"Unknown STATE_ANGLE {settings['STATE_ANGLE']!r}")
+
+        joints = settings['JOINTS']
+        side_a, side_b = settings['SIDE_DIST']
+        overlay = settings['OVERLAY']
+
+        return {
+            'angles': self._compile_angles(settings['ANGLES']),
+            'state_angle': settings['STATE_ANGLE'],
+            'joints': joints,
+            'left_joints': [self.left_features[joint] for joint in joints],
+            'right_joints': [self.right_features[joint] for joint in joints],
+            'side_dist': ((self.left_features[side_a], self.left_features[side_b]),
+                          (self.right_features[side_a], self.right_features[side_b])),
+            'skip_states': frozenset(faults['SKIP_STATES']),
+            'exclusive': faults['EXCLUSIVE'],
+            'rules': rules,
+            'feedback_labels': {
+                idx: static_label(feedback['msg'], feedback['pos'], font_scale=0.6,
+                                  text_color=feedback['text_color'],
+                                  text_color_bg=feedback['text_color_bg'])
+                for idx, feedback in settings['FEEDBACK_ID_MAP'].items()
+            },
+            'guides': overlay['GUIDES'],
+            'links': overlay['LINKS'],
+            'labels': overlay['LABELS']
+        }
+
+    def _compile_angles(self, angle_defs):
+        # Turn angle definitions into index arrays over a point table that
+        # holds the 33 landmarks followed by the 'vertical' helper points.
+        # Row 0 is the nose/shoulders offset angle, then every angle for the
+        # left side, then every angle for the right side.
+        vertical = []
+
+        def point(features, p):
+            if isinstance(p, tuple):
+                _, joint, dx = p
+                vertical.append((features[joint], dx))
+                return NUM_LANDMARKS + len(vertical) - 1
+            return features[p]
+
+        p1 = [self.left_features['shoulder']]
+        p2 = [self.right_features['shoulder']]
+        ref = [self.dict_features['nose']]
+
+        for features in (self.left_features, self.right_features):
+            for _, a, b, r in angle_defs:
+                p1.append(point(features, a))
+                p2.append(point(features, b))
+                ref.append(point(features, r))
+
+        return {
+            'names': [angle_def[0] for angle_def in angle_defs],
+            'points': np.zeros((NUM_LANDMARKS + len(vertical), 2), dtype=np.float64),
+            'vertical_src': np.array([j for j, _ in vertical], dtype=np.intp),
+            'vertical_dx': np.array([dx for _, dx in vertical], dtype=np.float64),
+            'p1': np.array(p1, dtype=np.intp),
+            'p2': np.array(p2, dtype=np.intp),
+            'ref': np.array(ref, dtype=np.intp)
+        }
+
+    def _compute_angles(self, spec, landmark_coords):
+        # Offset angle plus the exercise's angles for both sides, all in one
+        # batched find_angles call.
+        points = spec['points']
+        points[:NUM_LANDMARKS] = landmark_coords
+        points[NUM_LANDMARKS:, 0] = points[spec['vertical_src'], 0] + spec['vertical_dx']
 
-            'start_inactive_time_side': time.perf_counter(),
-            'start_inactive_time_front': time.perf_counter(),
-            'INACTIVE_TIME_SIDE': 0.0,
-            'INACTIVE_TIME_FRONT': 0.0,
+        angles = find_angles(
+            points[spec['p1']], points[spec['p2']], points[spec['ref']]).tolist()
 
-            'DISPLAY_TEXT': np.full((self.feedback_count,), False),
-            'COUNT_FRAMES': np.zeros((self.feedback_count,), dtype=np.int64),
+        names = spec['names']
+        n = len(names)
 
-            'INCORRECT_POSTURE': False,
+        return angles[0], dict(zip(names, angles[1:n + 1])), dict(zip(names, angles[n + 1:]))
 
-            'prev_state': None,
-            'curr_state': None,
+    def play_sound(self, path):
+        if self.mute:
+            return
+
+        if self.audio is None:
+            self.audio = get_player()
+
+        # Only queues the cue; playback happens on the player's thread.
+        self.audio.play(path)
+        return
 
+    def _begin_frame(self, timestamp):
+        self._stage_start = time.perf_counter()
+
+        if timestamp is None:
+            timestamp = self.clock()
+
+        if self.now is None:
+            self.state_tracker.start_inactive_time_side = timestamp
+            self.state_tracker.start_inactive_time_front = timestamp
+
+        self.now = timestamp
+
+    def _end_stage(self, stage):
+        # Latencies are wall-clock processing time, whatever drives self.now.
+        now = time.perf_counter()
+        self.metrics.record(stage, now - self._stage_start)
+        self._stage_start = now
+
+    # ------------------------------------------- ANALYSIS -------------------------------------------
+    #
+    # analyze() runs the landmark geometry, the rep state machine and the
+    # fault rules of the exercise in `settings` for one frame without
+    # touching any frame buffer. It returns a plain dict describing the frame:
+    #
+    #   'view'          'side' when the camera sees the lifter side on, 'front'
+    #                   when they need to turn, None when nobody was detected.
+    #   'offset_angle'  nose/shoulders alignment angle, None without landmarks.
+    #   'coords'        pixel coordinates of the exercise's JOINTS (nose and
+    #                   shoulders in the front view). These
+    #                   are views into `landmark_coords`, which the next call
+    #                   overwrites, so copy them if they must outlive it.
+    #   'joint_ids'     landmark index of every entry in 'coords'.
+    #   'landmarks'     normalized (33, 4) landmarks, None without any. Also
+    #                   reused by the next call.
+    #   'angles'        joint angles computed this frame.
+    #   'multiplier'    -1 when the left side faces the camera, 1 otherwise.
+    #   'state'         's1', 's2', 's3' or None.
+    #   'feedback'      ids into FEEDBACK_ID_MAP that should be on screen.
+    #   'fault_sound'   audio cue for a posture fault raised this frame.
+    #   'play_sound'    rep / reset cue, as returned by process().
+    #   'CORRECT_COUNT', 'INCORRECT_COUNT'
+    #
+    # render() draws a frame from such a result, and process() is simply
+    # analyze() followed by render().
+    #
+    # Both take an optional `timestamp` in seconds for the frame, e.g. its
+    # presentation time in a recording. Without one `self.clock` is read.
+    # Timestamps only need to be monotonic; inactivity is measured from the
+    # first frame.
+
+    def _new_result(self, frame_width, frame_height):
+        return {
+            'frame_width': frame_width,
+            'frame_height': frame_height,
+            'view': None,
+            'offset_angle': None,
+            'coords': {},
+            'joint_ids': {},
+            'landmarks': None,
+            'angles': {},
+            'multiplier': 1,
+            'state': None,
+            'feedback': (),
+            'fault_sound': None,
+            'play_sound': None,
             'CORRECT_COUNT': 0,
             'INCORRECT_COUNT': 0
-
         }
 
-    def _update_state_sequence(self, current_state):
+    def _extract_landmarks(self, keypoints, frame_width, frame_height):
+        # Pixel coordinates of all 33 landmarks, or None if nobody was found.
+        if isinstance(keypoints, PoseResult):
+            landmarks = keypoints.landmarks
+        elif keypoints.pose_landmarks:
+            landmarks = get_landmark_buffer(
+                keypoints.pose_landmarks.landmark, out=self.landmarks)
+        else:
+            landmarks = None
 
-        if current_state == 's2':
-            if (('s3' not in self.state_tracker['state_seq']) and (self.state_tracker['state_seq'].count('s2')) == 0) or \
-                    (('s3' in self.state_tracker['state_seq']) and (self.state_tracker['state_seq'].count('s2') == 1)):
-                self.state_tracker['state_seq'].append(current_state)
+        if self.recorder is not None and not self._extrapolated:
+            self.recorder.append(landmarks, self.now, frame_width, frame_height)
 
-        elif current_state == 's3':
-            if (current_state not in self.state_tracker['state_seq']) and 's2' in self.state_tracker['state_seq']:
-                self.state_tracker['state_seq'].append(current_state)
+        if self.smoother is not None:
+            if landmarks is None:
+                self.smoother.reset()
+            else:
+                self._smoothed[:] = landmarks
+                self._smoothed[:, :2] = self.smoother.smooth(
+                    landmarks[:, :2], self.now)
+                landmarks = self._smoothed
 
-    def _show_feedback(self, frame, c_frame, dict_maps):
+        if landmarks is None:
+            return None
 
-        for idx in np.where(c_frame)[0]:
-            draw_text(
-                frame,
-                dict_maps[idx]['msg'],
-                pos=dict_maps[idx]['pos'],
-                text_color=dict_maps[idx]['text_color'],
-                font_scale=0.6,
-                text_color_bg=dict_maps[idx]['text_color_bg']
-            )
+        self._landmarks_used = landmarks
 
-        return frame
+        self._frame_size[0] = frame_width
+        self._frame_size[1] = frame_height
 
-    def play_sound(self, path):
-        audio_dir = f'./asset/audio/{path}.mp3'
-        mixer.init()
-        mixer.music.load(audio_dir)
-        mixer.music.play()
-        return
+        return scale_landmarks(landmarks, self._frame_size, out=self.landmark_coords)
 
-    def process_barbell_curl(self, frame: np.array, pose):
-        play_sound = None
+    def _finish_result(self, result):
+        self._end_stage('state')
 
-        count = 0
+        result['CORRECT_COUNT'] = self.state_tracker.correct_count
+        result['INCORRECT_COUNT'] = self.state_tracker.incorrect_count
+        return result
 
-        new_frame_time = time.time()
-        fps = math.ceil(1/(new_frame_time-self.prev_frame_time))
-        self.prev_frame_time = new_frame_time
+    def _analyze_front_view(self, result):
+        result['view'] = 'front'
 
-        count += 1
-        if count == 1:
-            avg_fps = fps
-        else:
-            avg_fps = math.ceil(
-                (avg_fps * count + fps) / (count + 1))
+        display_inactivity = False
 
-        frame_height, frame_width, _ = frame.shape
+        end_time = self.now
+        self.state_tracker.inactive_time_front += end_time - \
+            self.state_tracker.start_inactive_time_front
+        self.state_tracker.start_inactive_time_front = end_time
 
-        # Process the image.
-        keypoints = pose.process(frame)
-
-        if keypoints.pose_landmarks:
-            landmark = keypoints.pose_landmarks.landmark
-
-            nose_coord = get_landmark_features(
-                landmark, self.dict_features, 'nose', frame_width, frame_height)
-
-            _, left_shldr_coord, left_elbow_coord, left_wrist_coord, left_hip_coord, _, _, left_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'left', frame_width, frame_height)
-
-            _, right_shldr_coord, right_elbow_coord, right_wrist_coord, right_hip_coord, _, _, right_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'right', frame_width, frame_height)
-
-            offset_angle = find_angle(
-                left_shldr_coord, right_shldr_coord, nose_coord)
-
-            if offset_angle > self.settings['OFFSET_THRESH']:
-                display_inactivity = False
-
-                end_time = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME_FRONT'] += end_time - \
-                    self.state_tracker['start_inactive_time_front']
-                self.state_tracker['start_inactive_time_front'] = end_time
-
-                if self.state_tracker['INACTIVE_TIME_FRONT'] >= self.settings['INACTIVE_THRESH']:
-                    self.state_tracker['CORRECT_COUNT'] = 0
-                    self.state_tracker['INCORRECT_COUNT'] = 0
-                    display_inactivity = True
-
-                cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
-                cv2.circle(frame, left_shldr_coord, 7,
-                        self.COLORS['yellow'], -1)
-                cv2.circle(frame, right_shldr_coord, 7,
-                        self.COLORS['magenta'], -1)
-
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-
-                if display_inactivity:
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
-
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
-
-                )
-
-                draw_text(
-                    frame,
-                    'TURN TO SIDE VIEW!!!',
-                    pos=(30, frame_height-60),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                draw_text(
-                    frame,
-                    'OFFSET ANGLE: '+str(offset_angle),
-                    pos=(30, frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                # Reset inactive times for side view.
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-                self.state_tracker['prev_state'] = None
-                self.state_tracker['curr_state'] = None
-
-            # Camera is aligned properly.
-            else:
+        if self.state_tracker.inactive_time_front >= self.settings['INACTIVE_THRESH']:
+            self.state_tracker.correct_count = 0
+            self.state_tracker.incorrect_count = 0
+            display_inactivity = True
 
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                )
+        if display_inactivity:
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.now
 
-                dist_left = abs(left_hip_coord[1] - left_shldr_coord[1])
-                dist_right = abs(right_hip_coord[1] - right_shldr_coord[1])
+        # Reset inactive times for side view.
+        self.state_tracker.start_inactive_time_side = self.now
+        self.state_tracker.inactive_time_side = 0.0
+        self.state_tracker.prev_state = None
+        self.state_tracker.curr_state = None
 
-                shldr_coord = None
-                elbow_coord = None
-                wrist_coord = None
-                hip_coord = None
+        return self._finish_result(result)
 
-                if dist_left > dist_right:
-                    shldr_coord = left_shldr_coord
-                    elbow_coord = left_elbow_coord
-                    wrist_coord = left_wrist_coord
-                    hip_coord = left_hip_coord
+    def _analyze_no_landmarks(self, result):
+        self._end_stage('geometry')
 
-                    multiplier = -1
+        end_time = self.now
+        self.state_tracker.inactive_time_side += end_time - \
+            self.state_tracker.start_inactive_time_side
 
-                else:
-                    shldr_coord = right_shldr_coord
-                    elbow_coord = right_elbow_coord
-                    wrist_coord = right_wrist_coord
-                    hip_coord = right_hip_coord
+        display_inactivity = False
 
-                    multiplier = 1
+        if self.state_tracker.inactive_time_side >= self.settings['INACTIVE_THRESH']:
+            self.state_tracker.correct_count = 0
+            self.state_tracker.incorrect_count = 0
+            display_inactivity = True
 
-                # ------------------- Vertical Angle calculation --------------
+        self.state_tracker.start_inactive_time_side = end_time
 
-                wrist_shldr_elbow_angle = find_angle(
-                    wrist_coord, shldr_coord, elbow_coord)
-                cv2.ellipse(frame, elbow_coord, (15, 15),
-                            angle=0, startAngle=-120, endAngle=-90-multiplier*wrist_shldr_elbow_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
+        if display_inactivity:
+            result['play_sound'] = 'reset_counters'
+            self.state_tracker.start_inactive_time_side = self.now
+            self.state_tracker.inactive_time_side = 0.0
 
-                # Removed hip_elbow_shldr_angle calculation and drawing
+        # Reset all other state variables
 
-                hip_vertical_angle = find_angle(
-                    shldr_coord, np.array([hip_coord[0], 0]), hip_coord)
-                cv2.ellipse(frame, shldr_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier*hip_vertical_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
-                draw_dotted_line(
-                    frame, hip_coord, start=hip_coord[1]-50, end=hip_coord[1], line_color=self.COLORS['blue'])
+        self.state_tracker.prev_state = None
+        self.state_tracker.curr_state = None
+        self.state_tracker.inactive_time_front = 0.0
+        self.state_tracker.incorrect_posture = False
+        self.state_tracker.clear_feedback()
+        self.state_tracker.start_inactive_time_front = self.now
 
-                # ------------------------------------------------------------
+        return self._finish_result(result)
 
-                # Join landmarks.
-                cv2.line(frame, shldr_coord, elbow_coord,
-                        self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, wrist_coord, elbow_coord,
-                        self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, shldr_coord, hip_coord,
-                        self.COLORS['light_blue'], 4, lineType=self.linetype)
+    def _get_state(self, ref_angle):
+        current_state = None
 
-                # Plot landmark points
-                cv2.circle(frame, shldr_coord, 7,
-                        self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, elbow_coord, 7,
-                        self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, wrist_coord, 7,
-                        self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, hip_coord, 7,
-                        self.COLORS['yellow'], -1,  lineType=self.linetype)
+        if self.settings['REF_ANGLE']['NORMAL'][0] <= int(ref_angle) <= self.settings['REF_ANGLE']['NORMAL'][1]:
+            current_state = 's1'
+        elif self.settings['REF_ANGLE']['TRANS'][0] <= int(ref_angle) <= self.settings['REF_ANGLE']['TRANS'][1]:
+            current_state = 's2'
+        elif self.settings['REF_ANGLE']['PASS'][0] <= int(ref_angle) <= self.settings['REF_ANGLE']['PASS'][1]:
+            current_state = 's3'
 
-                current_state = None
+        return current_state
 
-                if self.settings['REF_ANGLE']['NORMAL'][0] <= int(wrist_shldr_elbow_angle) <= self.settings['REF_ANGLE']['NORMAL'][1]:
-                    current_state = 's1'
-                elif self.settings['REF_ANGLE']['TRANS'][0] <= int(wrist_shldr_elbow_angle) <= self.settings['REF_ANGLE']['TRANS'][1]:
-                    current_state = 's2'
-                elif self.settings['REF_ANGLE']['PASS'][0] <= int(wrist_shldr_elbow_angle) <= self.settings['REF_ANGLE']['PASS'][1]:
-                    current_state = 's3'
-
-                self.state_tracker['curr_state'] = current_state
-                self._update_state_sequence(current_state)
-
-                # -------------------------------------- COMPUTE COUNTERS --------------------------------------
-                if current_state == 's1':
-
-                    if len(self.state_tracker['state_seq']) == 3 and not self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['CORRECT_COUNT'] += 1
-                        play_sound = str(self.state_tracker['CORRECT_COUNT'])
-
-                    elif 's2' in self.state_tracker['state_seq'] and len(self.state_tracker['state_seq']) == 1:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    elif self.state_tracker['INCORRECT_POSTURE'] and len(self.state_tracker['state_seq']) != 1:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    self.state_tracker['state_seq'] = []
-                    self.state_tracker['INCORRECT_POSTURE'] = False
-
-                # ----------------------------------------------------------------------------------------------------
-
-                # -------------------------------------- PERFORM FEEDBACK ACTIONS --------------------------------------
-
-                ply1 = False
-
-                if self.settings['HIP_THRESH'] < hip_vertical_angle:
-                    self.state_tracker['DISPLAY_TEXT'][0] = True  # Adjusted index
-                    self.state_tracker['INCORRECT_POSTURE'] = True
-                    ply1 = True
-
-                if ply1:
-                    self.play_sound('Barbellcurl_1')
-
-                # ----------------------------------------------------------------------------------------------------
-
-                # ----------------------------------- COMPUTE INACTIVITY ---------------------------------------------
-
-                display_inactivity = False
-
-                if self.state_tracker['curr_state'] == self.state_tracker['prev_state']:
-
-                    end_time = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                        self.state_tracker['start_inactive_time_side']
-                    self.state_tracker['start_inactive_time_side'] = end_time
-
-                    if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                        self.state_tracker['CORRECT_COUNT'] = 0
-                        self.state_tracker['INCORRECT_COUNT'] = 0
-                        display_inactivity = True
-
-                else:
-
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-
-                hip_text_coord_x = hip_coord[0] + 15
-
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-                    elbow_text_coord_x = frame_width - elbow_coord[0] + 55
-                    hip_text_coord_x = frame_width - hip_coord[0] + 20
-
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['DISPLAY_TEXT']] += 1
-                frame = self._show_feedback(
-                    frame, self.state_tracker['COUNT_FRAMES'], self.settings['FEEDBACK_ID_MAP'])
-
-                if display_inactivity:
-                    play_sound = 'reset_counters'
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-
-                cv2.putText(frame, str(int(wrist_shldr_elbow_angle)), (elbow_text_coord_x,
-                                                                    elbow_coord[1]+10), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(hip_vertical_angle)), (hip_text_coord_x,
-                                                                hip_coord[1]), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-
-                if self.state_tracker['curr_state'] is not None:
-                    draw_text(
-                        frame,
-                        "STAGE: " +
-                        str(self.state_tracker['curr_state']).replace('s', ''),
-                        pos=(int(frame_width*0.05), 30),
-                        text_color=(255, 255, 230),
-                        font_scale=0.8,
-                        text_color_bg=(128, 128, 128)
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
+    def _compute_counters(self, current_state, result):
+        if current_state != 's1':
+            return
 
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
+        if self.state_tracker.seq == SEQ_COMPLETE and not self.state_tracker.incorrect_posture:
+            self.state_tracker.correct_count += 1
+            result['play_sound'] = str(self.state_tracker.correct_count)
 
-                )
-
-                draw_text(
-                    frame,
-                    "Average FPS: " + str(avg_fps),
-                    pos=(int(frame_width*0.58), frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(102, 0, 204),
-
-                )
+        elif self.state_tracker.seq == SEQ_S2:
+            self.state_tracker.incorrect_count += 1
+            result['play_sound'] = 'incorrect'
 
-                self.state_tracker['DISPLAY_TEXT'][self.state_tracker['COUNT_FRAMES']
-                                                > self.settings['CNT_FRAME_THRESH']] = False
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['COUNT_FRAMES']
-                                                > self.settings['CNT_FRAME_THRESH']] = 0
-                self.state_tracker['prev_state'] = current_state
+        elif self.state_tracker.incorrect_posture:
+            self.state_tracker.incorrect_count += 1
+            result['play_sound'] = 'incorrect'
 
-        else:
-            if self.flip_frame:
-                frame = cv2.flip(frame, 1)
+        self.state_tracker.seq = SEQ_EMPTY
+        self.state_tracker.incorrect_posture = False
+
+    def _compute_side_inactivity(self):
+        display_inactivity = False
 
-            end_time = time.perf_counter()
-            self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                self.state_tracker['start_inactive_time_side']
+        if self.state_tracker.curr_state == self.state_tracker.prev_state:
 
-            display_inactivity = False
+            end_time = self.now
+            self.state_tracker.inactive_time_side += end_time - \
+                self.state_tracker.start_inactive_time_side
+            self.state_tracker.start_inactive_time_side = end_time
 
-            if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                self.state_tracker['CORRECT_COUNT'] = 0
-                self.state_tracker['INCORRECT_COUNT'] = 0
+            if self.state_tracker.inactive_time_side >= self.settings['INACTIVE_THRESH']:
+                self.state_tracker.correct_count = 0
+                self.state_tracker.incorrect_count = 0
                 display_inactivity = True
 
-            self.state_tracker['start_inactive_time_side'] = end_time
+        else:
 
-            draw_text(
-                frame,
-                "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 30),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(18, 185, 0)
-            )
-
-            draw_text(
-                frame,
-                "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 80),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(221, 0, 0),
+            self.state_tracker.start_inactive_time_side = self.now
+            self.state_tracker.inactive_time_side = 0.0
 
-            )
+        return display_inactivity
 
-            if display_inactivity:
-                play_sound = 'reset_counters'
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
+    def _check_faults(self, current_state, angles):
+        exercise = self.exercise
 
-            # Reset all other state variables
+        if current_state in exercise['skip_states']:
+            return None
 
-            self.state_tracker['prev_state'] = None
-            self.state_tracker['curr_state'] = None
-            self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-            self.state_tracker['INCORRECT_POSTURE'] = False
-            self.state_tracker['DISPLAY_TEXT'] = np.full(
-                (self.feedback_count,), False)
-            self.state_tracker['COUNT_FRAMES'] = np.zeros(
-                (self.feedback_count,), dtype=np.int64)
-            self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+        sound = None
+        for angle, above, below, feedback_id, incorrect, rule_sound, seq_count in exercise['rules']:
+            if not above < angles[angle] < below:
+                continue
+            if seq_count is not None and \
+                    self.state_tracker.seq_count(seq_count[0]) != seq_count[1]:
+                continue
 
-        return frame, play_sound
+            self.state_tracker.display_text[feedback_id] = True
+            if incorrect:
+                self.state_tracker.incorrect_posture = True
 
-    def process_bent_over_dumbbell_row(self, frame: np.array, pose):
-        play_sound = None
+            if sound is None:
+                sound = rule_sound
 
-        count = 0
+            if exercise['exclusive']:
+                break
 
-        new_frame_time = time.time()
-        fps = math.ceil(1/(new_frame_time-self.prev_frame_time))
-        self.prev_frame_time = new_frame_time
+        return sound
 
-        count += 1
-        if count == 1:
-            avg_fps = fps
+    def _analyze_side_view(self, result, ref_angle, angles):
+        """
+        Side-view tail: state machine, counters, fault rules, inactivity and
+        feedback display bookkeeping.
+        """
+        result['view'] = 'side'
+
+        # The FrameSkipper only extrapolates while the stage cannot have
+        # changed, so such a frame keeps the stage of the last detection.
+        if self._extrapolated:
+            current_state = self.state_tracker.curr_state
         else:
-            avg_fps = math.ceil(
-                (avg_fps * count + fps) / (count + 1))
+            current_state = self._get_state(ref_angle)
+        result['state'] = current_state
 
-        frame_height, frame_width, _ = frame.shape
+        self.state_tracker.curr_state = current_state
+        self.state_tracker.update_seq(current_state)
 
-        # Process the image.
-        keypoints = pose.process(frame)
-
-        if keypoints.pose_landmarks:
-            landmark = keypoints.pose_landmarks.landmark
-
-            # ------------------- Start Change Here 1 --------------
-            nose_coord = get_landmark_features(
-                landmark, self.dict_features, 'nose', frame_width, frame_height)
-
-            left_ear_coord, left_shldr_coord, left_elbow_coord, left_wrist_coord, left_hip_coord, left_knee_coord, left_ankle_coord, left_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'left', frame_width, frame_height)
-
-            right_ear_coord, right_shldr_coord, right_elbow_coord, right_wrist_coord, right_hip_coord, right_knee_coord, right_ankle_coord, right_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'right', frame_width, frame_height)
-
-            offset_angle = find_angle(
-                left_shldr_coord, right_shldr_coord, nose_coord)
-            # ------------------- End Change Here 1 --------------
-
-            # ------------------- Start Change Here 2--------------
-            if offset_angle > self.settings['OFFSET_THRESH']:
-                # ------------------- End Change Here 2 --------------
-                display_inactivity = False
-
-                end_time = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME_FRONT'] += end_time - \
-                    self.state_tracker['start_inactive_time_front']
-                self.state_tracker['start_inactive_time_front'] = end_time
-
-                if self.state_tracker['INACTIVE_TIME_FRONT'] >= self.settings['INACTIVE_THRESH']:
-                    self.state_tracker['CORRECT_COUNT'] = 0
-                    self.state_tracker['INCORRECT_COUNT'] = 0
-                    display_inactivity = True
-
-                cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
-                cv2.circle(frame, left_shldr_coord, 7,
-                           self.COLORS['yellow'], -1)
-                cv2.circle(frame, right_shldr_coord, 7,
-                           self.COLORS['magenta'], -1)
-
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-
-                if display_inactivity:
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
-
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
-
-                )
-
-                draw_text(
-                    frame,
-                    'TURN TO SIDE VIEW!!!',
-                    pos=(30, frame_height-60),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                draw_text(
-                    frame,
-                    'OFFSET ANGLE: '+str(offset_angle),
-                    pos=(30, frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                # Reset inactive times for side view.
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-                self.state_tracker['prev_state'] = None
-                self.state_tracker['curr_state'] = None
-
-            # Camera is aligned properly.
-            else:
+        if not self._extrapolated:
+            self._compute_counters(current_state, result)
 
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                )
-
-                # ------------------- Start Change Here 3--------------
-                dist_left = abs(left_foot_coord[1] - left_hip_coord[1])
-                dist_right = abs(right_foot_coord[1] - right_hip_coord[1])
-
-                ear_coord = None
-                shldr_coord = None
-                elbow_coord = None
-                wrist_coord = None
-                hip_coord = None
-                knee_coord = None
-                ankle_coord = None
-                foot_coord = None
-
-                if dist_left > dist_right:
-                    ear_coord = left_ear_coord
-                    shldr_coord = left_shldr_coord
-                    elbow_coord = left_elbow_coord
-                    wrist_coord = left_wrist_coord
-                    hip_coord = left_hip_coord
-                    knee_coord = left_knee_coord
-                    ankle_coord = left_ankle_coord
-                    foot_coord = left_foot_coord
-
-                    multiplier = -1
-
-                else:
-                    ear_coord = right_ear_coord
-                    shldr_coord = right_shldr_coord
-                    elbow_coord = right_elbow_coord
-                    wrist_coord = right_wrist_coord
-                    hip_coord = right_hip_coord
-                    knee_coord = right_knee_coord
-                    ankle_coord = right_ankle_coord
-                    foot_coord = right_foot_coord
-
-                    multiplier = 1
-
-                # ------------------- Verical Angle calculation --------------
-
-                elbow_hip_shldr_angle = find_angle(
-                    elbow_coord, hip_coord, shldr_coord)
-                cv2.ellipse(frame, shldr_coord, (30, 30),
-                            angle=0, startAngle=45, endAngle=45-multiplier*elbow_hip_shldr_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
-#
-                hip_vertical_angle = find_angle(
-                    np.array([hip_coord[0], 0]), shldr_coord, hip_coord)
-                cv2.ellipse(frame, hip_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier*hip_vertical_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
-                draw_dotted_line(
-                    frame, hip_coord, start=hip_coord[1]-50, end=hip_coord[1], line_color=self.COLORS['blue'])
-#
-                ankle_vertical_angle = find_angle(
-                    knee_coord, np.array([ankle_coord[0], 0]), ankle_coord)
-                cv2.ellipse(frame, ankle_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier*ankle_vertical_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
-                draw_dotted_line(
-                    frame, ankle_coord, start=ankle_coord[1]-50, end=ankle_coord[1]+20, line_color=self.COLORS['blue'])
-#
-                ear_hip_shldr_angle = find_angle(
-                    ear_coord, hip_coord, shldr_coord)
-
-                # ------------------------------------------------------------
-
-                # Join landmarks.
-                cv2.line(frame, ear_coord, shldr_coord,
-                         self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, shldr_coord, elbow_coord,
-                         self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, wrist_coord, elbow_coord,
-                         self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, shldr_coord, hip_coord,
-                         self.COLORS['light_blue'], 4, lineType=self.linetype)
-                cv2.line(frame, knee_coord, hip_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-                cv2.line(frame, ankle_coord, knee_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-                cv2.line(frame, ankle_coord, foot_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-
-                # Plot landmark points
-                cv2.circle(frame, ear_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, shldr_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, elbow_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, wrist_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, hip_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, knee_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, ankle_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, foot_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-
-                current_state = None
-
-                if self.settings['REF_ANGLE']['NORMAL'][0] <= int(elbow_hip_shldr_angle) <= self.settings['REF_ANGLE']['NORMAL'][1]:
-                    current_state = 's1'
-                elif self.settings['REF_ANGLE']['TRANS'][0] <= int(elbow_hip_shldr_angle) <= self.settings['REF_ANGLE']['TRANS'][1]:
-                    current_state = 's2'
-                elif self.settings['REF_ANGLE']['PASS'][0] <= int(elbow_hip_shldr_angle) <= self.settings['REF_ANGLE']['PASS'][1]:
-                    current_state = 's3'
-                # ------------------- End Change Here 3 --------------
-                self.state_tracker['curr_state'] = current_state
-                self._update_state_sequence(current_state)
-
-                # -------------------------------------- COMPUTE COUNTERS --------------------------------------
-                if current_state == 's1':
-
-                    if len(self.state_tracker['state_seq']) == 3 and not self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['CORRECT_COUNT'] += 1
-                        play_sound = str(self.state_tracker['CORRECT_COUNT'])
-
-                    elif 's2' in self.state_tracker['state_seq'] and len(self.state_tracker['state_seq']) == 1:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    elif self.state_tracker['INCORRECT_POSTURE'] and len(self.state_tracker['state_seq']) != 1:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    self.state_tracker['state_seq'] = []
-                    self.state_tracker['INCORRECT_POSTURE'] = False
-
-                # ----------------------------------------------------------------------------------------------------
-
-                # -------------------------------------- PERFORM FEEDBACK ACTIONS --------------------------------------
-
-                else:
-                    # ------------------- Start Change Here 4--------------
-                    ply0 = False
-                    ply1 = False
-                    ply2 = False
-
-                    if (hip_vertical_angle < self.settings['HIP_THRESH']):
-                        self.state_tracker['DISPLAY_TEXT'][0] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-                        ply0 = True
-#
-                    if (ankle_vertical_angle > self.settings['ANKLE_THRESH']):
-                        self.state_tracker['DISPLAY_TEXT'][1] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-                        ply1 = True
-
-                    if (self.settings['SHLDR_THRESH'] > ear_hip_shldr_angle):
-                        self.state_tracker['DISPLAY_TEXT'][2] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-                        ply2 = True
-
-                    if ply1 == True:
-                        self.play_sound('Bentover_1')
-                    elif ply2 == True:
-                        self.play_sound('Bentover_2')
-                    elif ply0 == True:
-                        self.play_sound('Bentover_0')
-
-                # ------------------- End Change Here 4 --------------
-                # ----------------------------------------------------------------------------------------------------
-
-                # ----------------------------------- COMPUTE INACTIVITY ---------------------------------------------
-
-                display_inactivity = False
-
-                if self.state_tracker['curr_state'] == self.state_tracker['prev_state']:
-
-                    end_time = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                        self.state_tracker['start_inactive_time_side']
-                    self.state_tracker['start_inactive_time_side'] = end_time
-
-                    if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                        self.state_tracker['CORRECT_COUNT'] = 0
-                        self.state_tracker['INCORRECT_COUNT'] = 0
-                        display_inactivity = True
-
-                else:
-
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-
-                # -------------------------------------------------------------------------------------------------------
-                # ------------------- Start Change Here 5 --------------
-                shldr_text_coord_x = shldr_coord[0] + 15
-                hip_text_coord_x = hip_coord[0] + 15
-
-                # ------------------- End Change Here 5 --------------
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-                    shldr_text_coord_x = frame_width - shldr_coord[0] + 15
-                    hip_text_coord_x = frame_width - hip_coord[0] + 15
-
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['DISPLAY_TEXT']] += 1
-                frame = self._show_feedback(
-                    frame, self.state_tracker['COUNT_FRAMES'], self.settings['FEEDBACK_ID_MAP'])
-
-                if display_inactivity:
-                    play_sound = 'reset_counters'
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-                # ------------------- Start Change Here 6 --------------
-                cv2.putText(frame, str(int(ear_hip_shldr_angle)), (shldr_text_coord_x,
-                            shldr_coord[1]+10), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(hip_vertical_angle)), (hip_text_coord_x,
-                            hip_coord[1]+10), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                # ------------------- End Change Here 6 --------------
-                if self.state_tracker['curr_state'] is not None:
-                    draw_text(
-                        frame,
-                        "STAGE: " +
-                        str(self.state_tracker['curr_state']).replace('s', ''),
-                        pos=(int(frame_width*0.05), 30),
-                        text_color=(255, 255, 230),
-                        font_scale=0.8,
-                        text_color_bg=(128, 128, 128)
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
-
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
-
-                )
-
-                draw_text(
-                    frame,
-                    "Average FPS: " + str(avg_fps),
-                    pos=(int(frame_width*0.58), frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(102, 0, 204),
-
-                )
-
-                self.state_tracker['DISPLAY_TEXT'][self.state_tracker['COUNT_FRAMES']
-                                                   > self.settings['CNT_FRAME_THRESH']] = False
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['COUNT_FRAMES']
-                                                   > self.settings['CNT_FRAME_THRESH']] = 0
-                self.state_tracker['prev_state'] = current_state
+            result['fault_sound'] = self._check_faults(current_state, angles)
 
-        else:
-            if self.flip_frame:
-                frame = cv2.flip(frame, 1)
+        display_inactivity = self._compute_side_inactivity()
 
-            end_time = time.perf_counter()
-            self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                self.state_tracker['start_inactive_time_side']
+        self.state_tracker.count_frames[self.state_tracker.display_text] += 1
+        result['feedback'] = tuple(
+            np.flatnonzero(self.state_tracker.count_frames).tolist())
 
-            display_inactivity = False
+        if display_inactivity:
+            result['play_sound'] = 'reset_counters'
+            self.state_tracker.start_inactive_time_side = self.now
+            self.state_tracker.inactive_time_side = 0.0
 
-            if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                self.state_tracker['CORRECT_COUNT'] = 0
-                self.state_tracker['INCORRECT_COUNT'] = 0
-                display_inactivity = True
+        self.state_tracker.display_text[self.state_tracker.count_frames
+                                           > self.settings['CNT_FRAME_THRESH']] = False
+        self.state_tracker.count_frames[self.state_tracker.count_frames
+                                           > self.settings['CNT_FRAME_THRESH']] = 0
+        self.state_tracker.prev_state = current_state
 
-            self.state_tracker['start_inactive_time_side'] = end_time
+        return self._finish_result(result)
 
-            draw_text(
-                frame,
-                "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 30),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(18, 185, 0)
-            )
-
-            draw_text(
-                frame,
-                "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 80),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(221, 0, 0),
+    def _left_faces_camera(self, landmark_coords):
+        (left_a, left_b), (right_a, right_b) = self.exercise['side_dist']
+        dist_left = abs(landmark_coords[left_a, 1] - landmark_coords[left_b, 1])
+        dist_right = abs(landmark_coords[right_a, 1] - landmark_coords[right_b, 1])
+        return dist_left > dist_right
+
+    def measure_angles(self, landmarks, frame_width, frame_height):
+        """
+        `(offset_angle, angles)` of the side facing the camera for a (33, 4)
+        landmark array, without touching the rep state. Used to look ahead
+        at landmarks before committing to them.
+        """
+        self._frame_size[0] = frame_width
+        self._frame_size[1] = frame_height
+        landmark_coords = scale_landmarks(
+            landmarks, self._frame_size, out=self._probe_coords)
+
+        offset_angle, left_angles, right_angles = self._compute_angles(
+            self.exercise['angles'], landmark_coords)
+
+        if self._left_faces_camera(landmark_coords):
+            return offset_angle, left_angles
+
+        return offset_angle, right_angles
 
-            )
+    def analyze(self, keypoints, frame_width, frame_height, timestamp=None):
+        self._begin_frame(timestamp)
+        result = self._new_result(frame_width, frame_height)
 
-            if display_inactivity:
-                play_sound = 'reset_counters'
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
+        landmark_coords = self._extract_landmarks(
+            keypoints, frame_width, frame_height)
 
-            # Reset all other state variables
+        if landmark_coords is None:
+            return self._analyze_no_landmarks(result)
 
-            self.state_tracker['prev_state'] = None
-            self.state_tracker['curr_state'] = None
-            self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-            self.state_tracker['INCORRECT_POSTURE'] = False
-            self.state_tracker['DISPLAY_TEXT'] = np.full(
-                (self.feedback_count,), False)
-            self.state_tracker['COUNT_FRAMES'] = np.zeros(
-                (self.feedback_count,), dtype=np.int64)
-            self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+        exercise = self.exercise
 
-        return frame, play_sound
+        offset_angle, left_angles, right_angles = self._compute_angles(
+            exercise['angles'], landmark_coords)
+        result['offset_angle'] = offset_angle
 
-    def process_squat_with_weights(self, frame: np.array, pose):
-        play_sound = None
+        self._end_stage('geometry')
 
-        count = 0
+        result['landmarks'] = self._landmarks_used
 
-        new_frame_time = time.time()
-        fps = math.ceil(1/(new_frame_time-self.prev_frame_time))
-        self.prev_frame_time = new_frame_time
+        if offset_angle > self.settings['OFFSET_THRESH'] and not self._extrapolated:
+            result['joint_ids'] = {
+                'nose': self.dict_features['nose'],
+                'left_shldr': self.left_features['shoulder'],
+                'right_shldr': self.right_features['shoulder']
+            }
+            result['coords'] = {
+                name: landmark_coords[idx] for name, idx in result['joint_ids'].items()
+            }
+            return self._analyze_front_view(result)
+
+        # Camera is aligned properly.
+        self.state_tracker.inactive_time_front = 0.0
+        self.state_tracker.start_inactive_time_front = self.now
+
+        if self._left_faces_camera(landmark_coords):
+            joints = exercise['left_joints']
+            angles = left_angles
+            result['multiplier'] = -1
 
-        count += 1
-        if count == 1:
-            avg_fps = fps
         else:
-            avg_fps = math.ceil(
-                (avg_fps * count + fps) / (count + 1))
+            joints = exercise['right_joints']
+            angles = right_angles
+            result['multiplier'] = 1
 
-        frame_height, frame_width, _ = frame.shape
+        result['joint_ids'] = dict(zip(exercise['joints'], joints))
+        result['coords'] = {
+            name: landmark_coords[idx] for name, idx in result['joint_ids'].items()
+        }
+        result['angles'] = angles
+
+        return self._analyze_side_view(result, angles[exercise['state_angle']], angles)
+
+    # ------------------------------------------- RENDERING -------------------------------------------
+    #
+    # Frames are drawn on in place. With flip_frame the skeleton is drawn
+    # first, the frame is mirrored in place and the screen-space HUD goes on
+    # top, so no frame-sized array is allocated per frame and the returned
+    # frame is the caller's own array.
+
+    def _mirror(self, frame):
+        if frame.flags.c_contiguous and frame.flags.writeable:
+            return cv2.flip(frame, 1, dst=frame)
+        return cv2.flip(frame, 1)
+
+    def _draw_counters(self, frame, result):
+        self.labels.draw_text(
+            frame,
+            "CORRECT: " + str(result['CORRECT_COUNT']),
+            pos=(int(result['frame_width']*0.68), 30),
+            text_color=(255, 255, 230),
+            font_scale=0.7,
+            text_color_bg=(18, 185, 0)
+        )
+
+        self.labels.draw_text(
+            frame,
+            "INCORRECT: " + str(result['INCORRECT_COUNT']),
+            pos=(int(result['frame_width']*0.68), 80),
+            text_color=(255, 255, 230),
+            font_scale=0.7,
+            text_color_bg=(221, 0, 0),
+
+        )
+
+    def _render_front_view(self, frame, result):
+        coords = result['coords']
+        frame_height = result['frame_height']
+
+        cv2.circle(frame, coords['nose'], 7, self.COLORS['white'], -1)
+        cv2.circle(frame, coords['left_shldr'], 7,
+                   self.COLORS['yellow'], -1)
+        cv2.circle(frame, coords['right_shldr'], 7,
+                   self.COLORS['magenta'], -1)
+
+        if self.flip_frame:
+            frame = self._mirror(frame)
+
+        self.hud.draw(frame, (static_label(
+            'TURN TO SIDE VIEW!!!',
+            pos=(30, frame_height-60),
+            text_color=(255, 255, 230),
+            font_scale=0.65,
+            text_color_bg=(255, 153, 0)
+        ),))
+
+        self._draw_counters(frame, result)
+
+        self.labels.draw_text(
+            frame,
+            'OFFSET ANGLE: '+str(result['offset_angle']),
+            pos=(30, frame_height-30),
+            text_color=(255, 255, 230),
+            font_scale=0.65,
+            text_color_bg=(255, 153, 0),
+        )
 
-        # Process the image.
-        keypoints = pose.process(frame)
-
-        if keypoints.pose_landmarks:
-            landmark = keypoints.pose_landmarks.landmark
-
-            # ------------------- Start Change Here 1 --------------
-            nose_coord = get_landmark_features(
-                landmark, self.dict_features, 'nose', frame_width, frame_height)
-
-            _, left_shldr_coord, _, _, left_hip_coord, left_knee_coord, left_ankle_coord, left_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'left', frame_width, frame_height)
-
-            _, right_shldr_coord, _, _, right_hip_coord, right_knee_coord, right_ankle_coord, right_foot_coord = get_landmark_features(
-                landmark, self.dict_features, 'right', frame_width, frame_height)
-
-            offset_angle = find_angle(
-                left_shldr_coord, right_shldr_coord, nose_coord)
-            # ------------------- End Change Here 1 --------------
-
-            # ------------------- Start Change Here 2--------------
-            if offset_angle > self.settings['OFFSET_THRESH']:
-                # ------------------- End Change Here 2 --------------
-                display_inactivity = False
-
-                end_time = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME_FRONT'] += end_time - \
-                    self.state_tracker['start_inactive_time_front']
-                self.state_tracker['start_inactive_time_front'] = end_time
-
-                if self.state_tracker['INACTIVE_TIME_FRONT'] >= self.settings['INACTIVE_THRESH']:
-                    self.state_tracker['CORRECT_COUNT'] = 0
-                    self.state_tracker['INCORRECT_COUNT'] = 0
-                    display_inactivity = True
-
-                cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
-                cv2.circle(frame, left_shldr_coord, 7,
-                           self.COLORS['yellow'], -1)
-                cv2.circle(frame, right_shldr_coord, 7,
-                           self.COLORS['magenta'], -1)
-
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-
-                if display_inactivity:
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
-
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
-
-                )
-
-                draw_text(
-                    frame,
-                    'TURN TO SIDE VIEW!!!',
-                    pos=(30, frame_height-60),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                draw_text(
-                    frame,
-                    'OFFSET ANGLE: '+str(offset_angle),
-                    pos=(30, frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                # Reset inactive times for side view.
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-                self.state_tracker['prev_state'] = None
-                self.state_tracker['curr_state'] = None
-
-            # Camera is aligned properly.
-            else:
+        return frame
 
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter(
-                )
+    def _render_no_landmarks(self, frame, result):
+        if self.flip_frame:
+            frame = self._mirror(frame)
 
-                # ------------------- Start Change Here 3--------------
-                dist_left = abs(left_foot_coord[1] - left_hip_coord[1])
-                dist_right = abs(right_foot_coord[1] - right_hip_coord[1])
+        self._draw_counters(frame, result)
 
-                hip_coord = None
-                knee_coord = None
-                ankle_coord = None
-                foot_coord = None
+        return frame
 
-                if dist_left > dist_right:
-                    hip_coord = left_hip_coord
-                    knee_coord = left_knee_coord
-                    ankle_coord = left_ankle_coord
-                    foot_coord = left_foot_coord
+    def _render_side_hud(self, frame, result, avg_fps):
+        """
+        Flip the frame if needed and draw everything that is written in
+        screen space. Angle labels are offset by dx, or by dx_flipped from
+        the mirrored joint position. Feedback and the stage box go on first,
+        as one HUD layer, then the labels that change every frame.
+        """
+        coords = result['coords']
+        angles = result['angles']
+        frame_width = result['frame_width']
+        frame_height = result['frame_height']
+
+        if self.flip_frame:
+            frame = self._mirror(frame)
+
+        feedback_labels = self.exercise['feedback_labels']
+        static_labels = tuple(feedback_labels[idx] for idx in result['feedback'])
+
+        if result['state'] is not None:
+            static_labels += (static_label(
+                "STAGE: " + str(result['state']).replace('s', ''),
+                pos=(int(frame_width*0.05), 30),
+                text_color=(255, 255, 230),
+                font_scale=0.8,
+                text_color_bg=(128, 128, 128)
+            ),)
 
-                    multiplier = -1
+        self.hud.draw(frame, static_labels)
 
-                else:
-                    hip_coord = right_hip_coord
-                    knee_coord = right_knee_coord
-                    ankle_coord = right_ankle_coord
-                    foot_coord = right_foot_coord
+        for angle_name, joint, dx, dx_flipped, dy in self.exercise['labels']:
+            angle = angles[angle_name]
+            coord = coords[joint]
 
-                    multiplier = 1
+            if self.flip_frame:
+                text_coord_x = frame_width - coord[0] + dx_flipped
+            else:
+                text_coord_x = coord[0] + dx
 
-                # ------------------- Verical Angle calculation --------------
+            cv2.putText(frame, str(int(angle)), (text_coord_x, coord[1]+dy),
+                        self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
 
-                knee_vertical_angle = find_angle(
-                    hip_coord, np.array([knee_coord[0]+0.1, 0]), knee_coord)
-                cv2.ellipse(frame, knee_coord, (20, 20),
-                            angle=0, startAngle=-90, endAngle=-90-multiplier*knee_vertical_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
+        self._draw_counters(frame, result)
 
-                draw_dotted_line(
-                    frame, knee_coord, start=knee_coord[1]-50, end=knee_coord[1]+20, line_color=self.COLORS['blue'])
+        self.labels.draw_text(
+            frame,
+            "Average FPS: " + str(avg_fps),
+            pos=(int(frame_width*0.58), frame_height-30),
+            text_color=(255, 255, 230),
+            font_scale=0.7,
+            text_color_bg=(102, 0, 204),
 
-                ankle_vertical_angle = find_angle(
-                    knee_coord, np.array([ankle_coord[0]+0.1, 0]), ankle_coord)
-                cv2.ellipse(frame, ankle_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier*ankle_vertical_angle,
-                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
+        )
 
+        return frame
+
+    def _render_other_view(self, frame, result):
+        if result['view'] == 'front':
+            return self._render_front_view(frame, result)
+
+        return self._render_no_landmarks(frame, result)
+
+    def _fit_result(self, frame, result):
+        # A result analyzed at another resolution, see analysis_width. Joint
+        # positions are scaled from the normalized landmarks, not from the
+        # truncated analysis pixels, so the overlay lands exactly where a
+        # full-resolution analysis would have put it.
+        frame_height, frame_width = frame.shape[:2]
+        if frame_width == result['frame_width'] and frame_height == result['frame_height']:
+            return result
+
+        result = dict(result, frame_width=frame_width, frame_height=frame_height)
+
+        if result['landmarks'] is not None:
+            self._display_size[0] = frame_width
+            self._display_size[1] = frame_height
+            display_coords = scale_landmarks(
+                result['landmarks'], self._display_size, out=self._display_coords)
+            result['coords'] = {
+                name: display_coords[idx] for name, idx in result['joint_ids'].items()
+            }
+
+        return result
+
+    def render(self, frame, result, avg_fps):
+        result = self._fit_result(frame, result)
+
+        if result['view'] != 'side':
+            return self._render_other_view(frame, result)
+
+        coords = result['coords']
+        angles = result['angles']
+        multiplier = result['multiplier']
+        exercise = self.exercise
+
+        for guide in exercise['guides']:
+            if guide[0] == 'arc':
+                _, joint, radius, start, end, direction, angle = guide
+                cv2.ellipse(frame, coords[joint], (radius, radius),
+                            angle=0, startAngle=start, endAngle=end + direction*multiplier*angles[angle],
+                            color=self.COLORS['white'], thickness=3,  lineType=self.linetype)
+            else:
+                _, joint, above, below = guide
                 draw_dotted_line(
-                    frame, ankle_coord, start=ankle_coord[1]-50, end=ankle_coord[1]+20, line_color=self.COLORS['blue'])
-                # ------------------------------------------------------------
+                    frame, coords[joint], start=coords[joint][1]-above, end=coords[joint][1]+below, line_color=self.COLORS['blue'])
 
-                # Join landmarks.
-                cv2.line(frame, knee_coord, hip_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-                cv2.line(frame, ankle_coord, knee_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-                cv2.line(frame, ankle_coord, foot_coord,
-                         self.COLORS['light_blue'], 4,  lineType=self.linetype)
-
-                # Plot landmark points
-                cv2.circle(frame, hip_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, knee_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, ankle_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-                cv2.circle(frame, foot_coord, 7,
-                           self.COLORS['yellow'], -1,  lineType=self.linetype)
-
-                current_state = None
-
-                if self.settings['REF_ANGLE']['NORMAL'][0] <= int(knee_vertical_angle) <= self.settings['REF_ANGLE']['NORMAL'][1]:
-                    current_state = 's1'
-                elif self.settings['REF_ANGLE']['TRANS'][0] <= int(knee_vertical_angle) <= self.settings['REF_ANGLE']['TRANS'][1]:
-                    current_state = 's2'
-                elif self.settings['REF_ANGLE']['PASS'][0] <= int(knee_vertical_angle) <= self.settings['REF_ANGLE']['PASS'][1]:
-                    current_state = 's3'
-
-                # ------------------- End Change Here 3 --------------
-                self.state_tracker['curr_state'] = current_state
-                self._update_state_sequence(current_state)
-
-                # -------------------------------------- COMPUTE COUNTERS --------------------------------------
-                if current_state == 's1':
-
-                    if len(self.state_tracker['state_seq']) == 3 and not self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['CORRECT_COUNT'] += 1
-                        play_sound = str(self.state_tracker['CORRECT_COUNT'])
-
-                    elif 's2' in self.state_tracker['state_seq'] and len(self.state_tracker['state_seq']) == 1:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    elif self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['INCORRECT_COUNT'] += 1
-                        play_sound = 'incorrect'
-
-                    self.state_tracker['state_seq'] = []
-                    self.state_tracker['INCORRECT_POSTURE'] = False
-
-                # ----------------------------------------------------------------------------------------------------
-
-                # -------------------------------------- PERFORM FEEDBACK ACTIONS --------------------------------------
-
-                else:
-                    # ------------------- Start Change Here 4--------------
-                    ply2 = False
-                    ply1 = False
-
-                    if self.settings['KNEE_THRESH'][0] < knee_vertical_angle < self.settings['KNEE_THRESH'][1] and \
-                       self.state_tracker['state_seq'].count('s2') == 1:
-                        self.state_tracker['DISPLAY_TEXT'][0] = True
-
-                    elif knee_vertical_angle > self.settings['KNEE_THRESH'][2]:
-                        self.state_tracker['DISPLAY_TEXT'][2] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-                        ply2 = True
-
-                    elif (ankle_vertical_angle > self.settings['ANKLE_THRESH']):
-                        self.state_tracker['DISPLAY_TEXT'][1] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-                        ply1 = True
-
-                    if ply2 == True:
-                        self.play_sound('Squat_2')
-                    elif ply2 == False and ply1 == True:
-                        self.play_sound('Squat_1')
-
-                    # ------------------- End Change Here 4 --------------
-                # ----------------------------------------------------------------------------------------------------
-
-                # ----------------------------------- COMPUTE INACTIVITY ---------------------------------------------
-
-                display_inactivity = False
-
-                if self.state_tracker['curr_state'] == self.state_tracker['prev_state']:
-
-                    end_time = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                        self.state_tracker['start_inactive_time_side']
-                    self.state_tracker['start_inactive_time_side'] = end_time
-
-                    if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                        self.state_tracker['CORRECT_COUNT'] = 0
-                        self.state_tracker['INCORRECT_COUNT'] = 0
-                        display_inactivity = True
-
-                else:
-
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-
-                # -------------------------------------------------------------------------------------------------------
-                # ------------------- Start Change Here 5 --------------
-                knee_text_coord_x = knee_coord[0] + 15
-                ankle_text_coord_x = ankle_coord[0] + 10
-                # ------------------- End Change Here 5 --------------
-                if self.flip_frame:
-                    frame = cv2.flip(frame, 1)
-                    knee_text_coord_x = frame_width - knee_coord[0] + 15
-                    ankle_text_coord_x = frame_width - ankle_coord[0] + 10
-
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['DISPLAY_TEXT']] += 1
-                frame = self._show_feedback(
-                    frame, self.state_tracker['COUNT_FRAMES'], self.settings['FEEDBACK_ID_MAP'])
-
-                if display_inactivity:
-                    play_sound = 'reset_counters'
-                    self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                    )
-                    self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-                # ------------------- Start Change Here 6 --------------
-                cv2.putText(frame, str(int(knee_vertical_angle)), (knee_text_coord_x,
-                            knee_coord[1]+10), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(ankle_vertical_angle)), (ankle_text_coord_x,
-                            ankle_coord[1]), self.font, 0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                # ------------------- End Change Here 6 --------------
-                if self.state_tracker['curr_state'] is not None:
-                    draw_text(
-                        frame,
-                        "STAGE: " +
-                        str(self.state_tracker['curr_state']).replace('s', ''),
-                        pos=(int(frame_width*0.05), 30),
-                        text_color=(255, 255, 230),
-                        font_scale=0.8,
-                        text_color_bg=(128, 128, 128)
-                    )
-
-                draw_text(
-                    frame,
-                    "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(18, 185, 0)
-                )
-
-                draw_text(
-                    frame,
-                    "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                    pos=(int(frame_width*0.68), 80),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(221, 0, 0),
-
-                )
-
-                draw_text(
-                    frame,
-                    "Average FPS: " + str(avg_fps),
-                    pos=(int(frame_width*0.58), frame_height-30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.7,
-                    text_color_bg=(102, 0, 204),
-
-                )
-
-                self.state_tracker['DISPLAY_TEXT'][self.state_tracker['COUNT_FRAMES']
-                                                   > self.settings['CNT_FRAME_THRESH']] = False
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['COUNT_FRAMES']
-                                                   > self.settings['CNT_FRAME_THRESH']] = 0
-                self.state_tracker['prev_state'] = current_state
+        # Join landmarks.
+        for start, end in exercise['links']:
+            cv2.line(frame, coords[start], coords[end],
+                     self.COLORS['light_blue'], 4, lineType=self.linetype)
 
-        else:
-            if self.flip_frame:
-                frame = cv2.flip(frame, 1)
+        # Plot landmark points
+        for joint in exercise['joints']:
+            cv2.circle(frame, coords[joint], 7,
+                       self.COLORS['yellow'], -1,  lineType=self.linetype)
 
-            end_time = time.perf_counter()
-            self.state_tracker['INACTIVE_TIME_SIDE'] += end_time - \
-                self.state_tracker['start_inactive_time_side']
+        return self._render_side_hud(frame, result, avg_fps)
 
-            display_inactivity = False
+    # ------------------------------------------- FULL FRAME -------------------------------------------
 
-            if self.state_tracker['INACTIVE_TIME_SIDE'] >= self.settings['INACTIVE_THRESH']:
-                self.state_tracker['CORRECT_COUNT'] = 0
-                self.state_tracker['INCORRECT_COUNT'] = 0
-                display_inactivity = True
+    def analysis_size(self, frame_width, frame_height):
+        """The `(width, height)` analyze() works in for a frame of this size."""
+        if not self.analysis_width:
+            return frame_width, frame_height
 
-            self.state_tracker['start_inactive_time_side'] = end_time
+        return self.analysis_width, max(1, round(frame_height * self.analysis_width / frame_width))
 
-            draw_text(
-                frame,
-                "CORRECT: " + str(self.state_tracker['CORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 30),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(18, 185, 0)
-            )
-
-            draw_text(
-                frame,
-                "INCORRECT: " + str(self.state_tracker['INCORRECT_COUNT']),
-                pos=(int(frame_width*0.68), 80),
-                text_color=(255, 255, 230),
-                font_scale=0.7,
-                text_color_bg=(221, 0, 0),
-
-            )
-
-            if display_inactivity:
-                play_sound = 'reset_counters'
-                self.state_tracker['start_inactive_time_side'] = time.perf_counter(
-                )
-                self.state_tracker['INACTIVE_TIME_SIDE'] = 0.0
-
-            # Reset all other state variables
-
-            self.state_tracker['prev_state'] = None
-            self.state_tracker['curr_state'] = None
-            self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-            self.state_tracker['INCORRECT_POSTURE'] = False
-            self.state_tracker['DISPLAY_TEXT'] = np.full(
-                (self.feedback_count,), False)
-            self.state_tracker['COUNT_FRAMES'] = np.zeros(
-                (self.feedback_count,), dtype=np.int64)
-            self.state_tracker['start_inactive_time_front'] = time.perf_counter()
-
-        return frame, play_sound
+    def pose_input(self, frame):
+        """
+        The frame the pose estimator should see: `frame` itself, or with an
+        analysis width a downscaled copy that the next call overwrites.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        size = self.analysis_size(frame_width, frame_height)
+        if size[0] >= frame_width:
+            return frame
+
+        start = time.perf_counter()
+        if self._analysis_frame is None or self._analysis_frame.shape[1::-1] != size:
+            self._analysis_frame = np.empty(
+                (size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+
+        cv2.resize(frame, size, dst=self._analysis_frame, interpolation=cv2.INTER_AREA)
+        self.metrics.record('resize', time.perf_counter() - start)
+        return self._analysis_frame
+
+    def process(self, frame: np.array, pose, keypoints=None, timestamp=None):
+        frame_start = time.perf_counter()
+
+        if timestamp is None:
+            timestamp = self.clock()
+
+        self.metrics.tick(timestamp)
+
+        frame_height, frame_width, _ = frame.shape
+        analysis_width, analysis_height = self.analysis_size(
+            frame_width, frame_height)
+
+        # Process the image, unless a pipeline stage already did.
+        self._extrapolated = False
+        if keypoints is None:
+            analysis_frame = self.pose_input(frame)
+            if self.skipper is not None:
+                keypoints = self.skipper.keypoints(analysis_frame, pose, timestamp)
+                self._extrapolated = self.skipper.extrapolated
+            else:
+                start = time.perf_counter()
+                keypoints = pose.process(analysis_frame)
+                self.metrics.record('inference', time.perf_counter() - start)
+
+        result = self.analyze(
+            keypoints, analysis_width, analysis_height, timestamp)
+        self._extrapolated = False
+
+        if result['fault_sound'] is not None:
+            self.play_sound(result['fault_sound'])
+
+        fps = self.metrics.ewma_fps
+        avg_fps = math.ceil(fps) if fps is not None else 0
+
+        start = time.perf_counter()
+        frame = self.render(frame, result, avg_fps)
+        self.metrics.record('render', time.perf_counter() - start)
+
+        if self.skipper is not None:
+            self.skipper.frame_done()
+
+        if self.metrics.frames == 1:
+            mark('first frame', time.perf_counter() - frame_start, once=True)
+
+        return frame, result['play_sound']
@@ -0,0 +1,126 @@
+import asyncio
+import collections
+
+from server import PoseServer
+
+
+class AsyncStream:
+    """
+    One client's stream on an AsyncPoseServer. `submit()` never waits on
+    inference; processed frames come back, in submission order, by
+    iterating the stream:
+
+        async for frame, play_sound in stream:
+            await websocket.send_bytes(encode(frame))
+
+    At most `max_results` processed frames wait to be read. A client that
+    reads slower than it submits loses its oldest results first, like its
+    oldest waiting frames on the server side.
+    """
+
+    def __init__(self, server, stream_id, loop, max_results):
+        self.server = server
+        self.stream_id = stream_id
+        self.session = None
+
+        self._loop = loop
+        self._results = collections.deque(maxlen=max_results)
+        self._ready = asyncio.Event()
+        self._finished = False
+
+        self.dropped_results = 0
+
+    def _on_result(self, session, frame, play_sound):
+        # Called on a worker thread.
+        self._loop.call_soon_threadsafe(self._push, (frame, play_sound))
+
+    def _push(self, item):
+        if len(self._results) == self._results.maxlen:
+            self.dropped_results += 1
+        self._results.append(item)
+        self._ready.set()
+
+    async def submit(self, frame, timestamp=None):
+        """
+        Queue an RGB frame. Returns False when an older frame, still waiting
+        for a worker, was dropped to make room.
+        """
+        return self.server.submit(self.stream_id, frame, timestamp)
+
+    def cancel_pending(self):
+        """Drop every frame still waiting for a worker; returns how many."""
+        return self.server.cancel_pending(self.stream_id)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._results:
+            if self._finished:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+
+        return self._results.popleft()
+
+    def _finish(self):
+        # Results already delivered can still be read, then iteration ends.
+        self._finished = True
+        self._ready.set()
+
+
+class AsyncPoseServer:
+    """
+    asyncio front end to PoseServer for services that receive frames on an
+    event loop, e.g. over WebSockets.
+
+    Inference and drawing run on the PoseServer's `pool_size` worker
+    threads, never on the event loop. Each stream keeps its frames in order
+    with one frame in flight at a time, and at most `max_pending` waiting:
+    when a client sends faster than it is served, its stalest frames are
+    dropped instead of queuing up latency.
+
+        async with AsyncPoseServer(pool_size=4) as server:
+            stream = server.add_stream('tablet-3', get_barbell_curl())
+            await stream.submit(frame, timestamp)
+            async for frame, play_sound in stream:
+                ...
+    """
+
+    def __init__(self, pool_size=4, max_pending=2, max_results=2, pose_factory=None, pose_kwargs=None):
+        self.server = PoseServer(pool_size=pool_size, max_pending=max_pending,
+                                 pose_factory=pose_factory, pose_kwargs=pose_kwargs)
+        self.max_results = max_results
+        self._streams = {}
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        self.server.start()
+
+    async def close(self):
+        # Joining the workers waits for the frames they hold.
+        await asyncio.get_running_loop().run_in_executor(None, self.server.close)
+
+        for stream in self._streams.values():
+            stream._finish()
+        self._streams.clear()
+
+    def add_stream(self, stream_id, settings, **activity_kwargs):
+        stream = AsyncStream(self.server, stream_id,
+                             asyncio.get_running_loop(), self.max_results)
+        stream.session = self.server.add_stream(
+            stream_id, settings, on_result=stream._on_result, **activity_kwargs)
+        self._streams[stream_id] = stream
+        return stream
+
+    def remove_stream(self, stream_id):
+        stream = self._streams.pop(stream_id)
+        self.server.remove_stream(stream_id)
+        stream._finish()
+        return stream
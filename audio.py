@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+
+
+class AudioCuePlayer:
+    """
+    Plays the coaching cues in `audio_dir` (`<cue>.mp3`) without ever blocking
+    the frame loop.
+
+    A background thread initialises the mixer, decodes every cue file once
+    into memory and then plays cues from a queue. `start()` it ahead of the
+    first cue so the decoding is out of the way; `play()` only enqueues.
+    Repeats are dropped: a cue that is already waiting in the queue or that
+    started less than `min_interval` seconds ago is ignored, so a posture
+    fault raised on every frame is heard once instead of restarting each
+    frame. Like the old mixer.music playback, a new cue cuts off the one
+    currently playing.
+    """
+
+    def __init__(self, audio_dir='./asset/audio', min_interval=2.0):
+        self.audio_dir = audio_dir
+        self.min_interval = min_interval
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._last_played = {}
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def play(self, cue):
+        now = time.monotonic()
+
+        with self._lock:
+            if cue in self._pending:
+                return False
+            if now - self._last_played.get(cue, -self.min_interval) < self.min_interval:
+                return False
+            self._pending.add(cue)
+
+        if self._thread is None:
+            self.start()
+
+        self._queue.put(cue)
+        return True
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _load(self, mixer, cue):
+        from pygame import error
+
+        try:
+            return mixer.Sound(os.path.join(self.audio_dir, f'{cue}.mp3'))
+        except (error, FileNotFoundError):
+            return None
+
+    def _run(self):
+        from pygame import error, mixer
+
+        try:
+            mixer.init()
+        except error:
+            # No audio device, e.g. on a server: drain the queue silently.
+            mixer = None
+
+        sounds = {}
+        channel = None
+        if mixer is not None:
+            if os.path.isdir(self.audio_dir):
+                for name in os.listdir(self.audio_dir):
+                    cue, ext = os.path.splitext(name)
+                    if ext == '.mp3':
+                        sounds[cue] = self._load(mixer, cue)
+            channel = mixer.Channel(0)
+
+        while True:
+            cue = self._queue.get()
+            if cue is None:
+                break
+
+            with self._lock:
+                self._pending.discard(cue)
+                self._last_played[cue] = time.monotonic()
+
+            if channel is None:
+                continue
+
+            if cue not in sounds:
+                sounds[cue] = self._load(mixer, cue)
+
+            if sounds[cue] is not None:
+                channel.play(sounds[cue])
+
+
+# Shared by every Activity in the process; there is only one mixer anyway.
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_player():
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AudioCuePlayer()
+        return _player
@@ -0,0 +1,201 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from activity import Activity
+from reps import count_reps
+from tracks import Track, load_track, save_track
+from utils import NUM_LANDMARKS, PoseResult, get_mediapipe_pose, get_landmark_buffer
+
+
+# Pose estimator owned by each worker process.
+_worker_pose = None
+
+
+def _init_worker(pose_kwargs):
+    global _worker_pose
+    _worker_pose = get_mediapipe_pose(**pose_kwargs)
+
+
+def _extract_chunk(video_path, start, stop, warmup_frames):
+    """
+    Run pose estimation over frames [start, stop) of the video and return
+    their landmarks as a (frames, 33, 4) float32 array, NaN where nobody was
+    detected, along with each frame's presentation time in seconds.
+    `stop=None` reads until the end of the clip.
+
+    The `warmup_frames` preceding the chunk are run through the estimator
+    too, so its tracker has settled by the first frame we keep.
+    """
+    cap = cv2.VideoCapture(video_path)
+    first = max(0, start - warmup_frames)
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    landmarks = []
+    timestamps = []
+    idx = first
+    frame = rgb = None
+    try:
+        while stop is None or idx < stop:
+            # Decode and convert into the same two buffers every frame.
+            ok, frame = cap.read(frame)
+            if not ok:
+                break
+
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+            keypoints = _worker_pose.process(rgb)
+
+            if idx >= start:
+                timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+                if keypoints.pose_landmarks:
+                    landmarks.append(get_landmark_buffer(
+                        keypoints.pose_landmarks.landmark))
+                else:
+                    landmarks.append(
+                        np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32))
+            idx += 1
+    finally:
+        cap.release()
+
+    if not landmarks:
+        return np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32), np.empty(0)
+
+    return np.stack(landmarks), np.array(timestamps)
+
+
+def _split(frame_count, chunk_frames):
+    if frame_count <= 0:
+        # Unknown length, read everything in one go.
+        return [(0, None)]
+
+    bounds = list(range(0, frame_count, chunk_frames)) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def replay(landmarks, settings, frame_width, frame_height, timestamps=None, fps=30.0, smoothing=None):
+    """
+    Feed a (frames, 33, 4) landmark array through a fresh `Activity` in order
+    and return the final counters together with the per-frame sound events.
+    Runs headless: nothing is drawn.
+
+    Inactivity is timed on the clip's timeline: `timestamps` holds each
+    frame's presentation time in seconds, or frames are assumed to be spaced
+    evenly at `fps`. `smoothing` is passed on to the Activity.
+
+    `reps.count_reps` returns the same in one vectorized pass; this is the
+    frame-by-frame reference it is checked against.
+    """
+    if timestamps is None:
+        timestamps = np.arange(len(landmarks)) / fps
+
+    activity = Activity(settings, mute=True, smoothing=smoothing)
+
+    events = []
+    for idx, frame_landmarks in enumerate(landmarks):
+        if np.isnan(frame_landmarks[0, 0]):
+            keypoints = PoseResult()
+        else:
+            keypoints = PoseResult(frame_landmarks)
+
+        result = activity.analyze(
+            keypoints, frame_width, frame_height, float(timestamps[idx]))
+        if result['play_sound'] is not None:
+            events.append((idx, result['play_sound']))
+
+    return {
+        'CORRECT_COUNT': activity.state_tracker.correct_count,
+        'INCORRECT_COUNT': activity.state_tracker.incorrect_count,
+        'events': events,
+    }
+
+
+def replay_track(track, settings, smoothing=None):
+    """
+    Score a recorded landmark track, either a `tracks.Track` or the path of
+    one saved by `analyze_video(..., track_path=...)` or an Activity's
+    recorder, without running pose estimation. Re-scoring after a settings
+    or `smoothing` change only costs one vectorized pass of
+    `reps.count_reps`.
+    """
+    if not isinstance(track, Track):
+        track = load_track(track, mmap_mode='r')
+
+    result = count_reps(track.landmarks, settings,
+                        track.frame_width, track.frame_height, track.timestamps,
+                        smoothing=smoothing)
+    result['frames'] = len(track)
+
+    return result
+
+
+def analyze_video(
+    video_path,
+    settings,
+    workers=None,
+    chunk_seconds=10.0,
+    warmup_frames=15,
+    pose_kwargs=None,
+    track_path=None,
+    smoothing=None
+):
+    """
+    Score a recorded set offline.
+
+    The clip is split into chunks of roughly `chunk_seconds` that are decoded
+    and run through MediaPipe in a process pool, one pose model per worker.
+    Only landmark extraction is sharded: the chunks' landmarks are stitched
+    back together and scored in order by `reps.count_reps`, so
+    CORRECT/INCORRECT match a sequential run over the same landmarks.
+
+    `settings` is the exercise's dict from `settings.py`, for example
+    `get_squat_with_weights()`. With `track_path` the extracted landmarks
+    are also saved there, for `replay_track` to score again later.
+
+    MediaPipe's own smoothing restarts with every chunk. A `smoothing`
+    filter (see smoothing.py) runs over the stitched track in order instead,
+    so with `pose_kwargs={'smooth_landmarks': False}` chunk boundaries no
+    longer matter.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f'Could not open video: {video_path}')
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    chunks = _split(frame_count, chunk_frames)
+
+    if workers is None:
+        workers = min(len(chunks), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(pose_kwargs or {},)
+    ) as pool:
+        futures = [
+            pool.submit(_extract_chunk, video_path, start, stop, warmup_frames)
+            for start, stop in chunks
+        ]
+        extracted = [future.result() for future in futures]
+
+    landmarks = np.concatenate([chunk[0] for chunk in extracted])
+    timestamps = np.concatenate([chunk[1] for chunk in extracted])
+
+    if track_path is not None:
+        save_track(track_path, landmarks, timestamps,
+                   frame_width, frame_height)
+
+    result = count_reps(landmarks, settings,
+                        frame_width, frame_height, timestamps, smoothing=smoothing)
+    result['frames'] = len(landmarks)
+    result['fps'] = fps
+
+    return result
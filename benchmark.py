@@ -0,0 +1,340 @@
+"""
+Offline benchmark of the per-frame hot path.
+
+Drives `Activity.process` for every exercise with a stub pose estimator that
+replays synthetic landmarks, at 480p, 720p and 1080p, and reports per-stage
+latency and memory allocation. Nothing runs MediaPipe, so results only
+depend on our own code and can be compared between commits:
+
+    python benchmark.py --out before.json
+    ... change something ...
+    python benchmark.py --out after.json --compare before.json
+
+`--check-labels` instead checks that cached HUD labels paint exactly what
+`utils.draw_text` paints, including where a frame border cuts them.
+"""
+import argparse
+import json
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import settings
+from activity import Activity
+from overlay import LabelCache
+from utils import NUM_LANDMARKS, PoseResult, draw_text
+
+
+EXERCISES = ('barbell_curl', 'bent_over_dumbbell_row', 'squat_with_weights')
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080)
+}
+
+LEFT = {'ear': 7, 'shoulder': 11, 'elbow': 13, 'wrist': 15,
+        'hip': 23, 'knee': 25, 'ankle': 27, 'foot': 31}
+RIGHT = {'ear': 8, 'shoulder': 12, 'elbow': 14, 'wrist': 16,
+         'hip': 24, 'knee': 26, 'ankle': 28, 'foot': 32}
+
+
+def _polar(origin, degrees, length):
+    # Point `length` away from `origin`, `degrees` clockwise from straight up.
+    angle = math.radians(degrees)
+    return origin + length * np.array([math.sin(angle), -math.cos(angle)])
+
+
+def _skeleton(exercise, phase, fault):
+    # Normalized side-view joints for one point of a rep, `phase` going
+    # 0 -> 1 -> 0 over the rep.
+    joints = {}
+
+    if exercise == 'barbell_curl':
+        joints['shoulder'] = np.array([0.5, 0.3])
+        joints['hip'] = np.array([0.5 + (0.08 if fault else 0.0), 0.6])
+        joints['elbow'] = np.array([0.5, 0.45])
+        joints['wrist'] = _polar(joints['elbow'], 150 - 112 * phase, 0.13)
+        joints['ear'] = joints['shoulder'] + [0.0, -0.06]
+        joints['knee'] = np.array([0.5, 0.75])
+        joints['ankle'] = np.array([0.5, 0.9])
+        joints['foot'] = np.array([0.55, 0.92])
+
+    elif exercise == 'bent_over_dumbbell_row':
+        torso = 30 if fault else 70
+        joints['hip'] = np.array([0.45, 0.55])
+        joints['shoulder'] = _polar(joints['hip'], torso, 0.25)
+        joints['ear'] = _polar(joints['hip'], torso, 0.32)
+        joints['elbow'] = _polar(
+            joints['shoulder'], torso + 130 + 47 * phase, 0.12)
+        joints['wrist'] = joints['elbow'] + [0.0, 0.1]
+        joints['knee'] = np.array([0.47, 0.72])
+        joints['ankle'] = np.array([0.46, 0.9])
+        joints['foot'] = np.array([0.52, 0.92])
+
+    else:
+        joints['ankle'] = np.array([0.5, 0.9])
+        joints['knee'] = _polar(joints['ankle'], 50 if fault else 20, 0.15)
+        joints['hip'] = _polar(joints['knee'], -(5 + 85 * phase), 0.18)
+        joints['shoulder'] = _polar(joints['hip'], 20, 0.25)
+        joints['ear'] = _polar(joints['hip'], 20, 0.32)
+        joints['elbow'] = joints['shoulder'] + [0.02, 0.1]
+        joints['wrist'] = joints['elbow'] + [0.05, 0.0]
+        joints['foot'] = joints['ankle'] + [0.06, 0.02]
+
+    return joints
+
+
+def synthetic_landmarks(exercise, frames, seed=0, period=60, fault_rate=0.3, dropout=0.02):
+    """
+    A (frames, 33, 4) landmark track of someone doing `exercise` side on:
+    a rep every `period` frames, a `fault_rate` share of reps done with
+    bad form, a little jitter and a `dropout` share of frames where nobody
+    is detected (NaN), like a recorded track.
+    """
+    rng = np.random.default_rng(seed)
+    landmarks = np.empty((frames, NUM_LANDMARKS, 4), dtype=np.float32)
+
+    fault = False
+    for idx in range(frames):
+        step = idx % period
+        if step == 0:
+            fault = rng.random() < fault_rate
+
+        if rng.random() < dropout:
+            landmarks[idx] = np.nan
+            continue
+
+        joints = _skeleton(exercise, 1 - abs(1 - 2 * step / period), fault)
+
+        frame_landmarks = landmarks[idx]
+        frame_landmarks[:, :2] = 0.5
+        frame_landmarks[:, 2] = 0.0
+        frame_landmarks[:, 3] = 0.9
+        frame_landmarks[0, :2] = joints['ear'] + [0.03, 0.0]
+        for name, lm_idx in LEFT.items():
+            frame_landmarks[lm_idx, :2] = joints[name] + \
+                rng.normal(0, 0.002, 2)
+        for name, lm_idx in RIGHT.items():
+            frame_landmarks[lm_idx, :2] = joints[name] + \
+                [0.004, 0.001] + rng.normal(0, 0.002, 2)
+
+    return landmarks
+
+
+class StubPose:
+    """Stands in for MediaPipe's Pose, returning one track row per call."""
+
+    def __init__(self, landmarks):
+        self.landmarks = landmarks
+        self.idx = 0
+
+    def process(self, frame):
+        frame_landmarks = self.landmarks[self.idx % len(self.landmarks)]
+        self.idx += 1
+
+        if np.isnan(frame_landmarks[0, 0]):
+            return PoseResult()
+        return PoseResult(frame_landmarks)
+
+
+def _percentiles(seconds):
+    values = np.percentile(np.asarray(seconds), (50, 95, 99)) * 1000.0
+    return {f'p{p}': float(v) for p, v in zip((50, 95, 99), values)}
+
+
+def _run(activity, pose, background, frame, frames, fps, first=0):
+    totals = []
+
+    for idx in range(first, first + frames):
+        np.copyto(frame, background)
+
+        start = time.perf_counter()
+        activity.process(frame, pose, timestamp=idx / fps)
+        totals.append(time.perf_counter() - start)
+
+    return totals
+
+
+def bench_case(exercise, resolution, frames=300, warmup=30, fps=30.0, seed=0):
+    """Time one exercise at one resolution, then measure its allocations."""
+    frame_width, frame_height = RESOLUTIONS[resolution]
+    exercise_settings = getattr(settings, 'get_' + exercise)()
+    landmarks = synthetic_landmarks(exercise, frames + warmup, seed=seed)
+
+    # A textured frame, so drawing and copying see realistic pixel data.
+    rng = np.random.default_rng(seed)
+    background = cv2.resize(
+        rng.integers(0, 255, (frame_height // 8, frame_width // 8, 3), dtype=np.uint8),
+        (frame_width, frame_height), interpolation=cv2.INTER_LINEAR)
+
+    frame = np.empty_like(background)
+
+    activity = Activity(exercise_settings, mute=True)
+    pose = StubPose(landmarks)
+
+    _run(activity, pose, background, frame, warmup, fps)
+    activity.metrics.reset()
+    totals = _run(activity, pose, background, frame, frames, fps, warmup)
+
+    stages = {}
+    for stage in ('inference', 'geometry', 'state', 'render'):
+        stats = activity.metrics.latency(stage)
+        if stats is not None:
+            stats.pop('count')
+            stages[stage] = stats
+
+    # Allocations in a separate pass: tracing slows everything down.
+    tracemalloc.start()
+    try:
+        start_current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _run(activity, pose, background, frame, frames, fps, warmup + frames)
+        end_current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'exercise': exercise,
+        'resolution': resolution,
+        'frames': frames,
+        'frame_ms': _percentiles(totals),
+        'frames_per_second': frames / sum(totals),
+        'stage_ms': stages,
+        'alloc_peak_kb': (peak - start_current) / 1024.0,
+        'alloc_retained_kb': (end_current - start_current) / 1024.0,
+        'counts': [activity.state_tracker.correct_count, activity.state_tracker.incorrect_count]
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(exercises=EXERCISES, resolutions=tuple(RESOLUTIONS), frames=300, warmup=30, seed=0):
+    return {
+        'meta': {
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': [
+            bench_case(exercise, resolution, frames, warmup, seed=seed)
+            for exercise in exercises
+            for resolution in resolutions
+        ]
+    }
+
+
+def compare(current, baseline):
+    """Lines comparing the p50 frame and stage times of two suite results."""
+    before = {(r['exercise'], r['resolution']): r for r in baseline['results']}
+
+    lines = []
+    for result in current['results']:
+        old = before.get((result['exercise'], result['resolution']))
+        if old is None:
+            continue
+
+        parts = [f"{result['exercise']:<24} {result['resolution']:>5}"]
+        pairs = [('frame', result['frame_ms'], old['frame_ms'])]
+        pairs += [(stage, stats, old['stage_ms'].get(stage))
+                  for stage, stats in result['stage_ms'].items()]
+        for name, new_stats, old_stats in pairs:
+            if not old_stats or not old_stats['p50']:
+                continue
+            change = 100.0 * (new_stats['p50'] / old_stats['p50'] - 1.0)
+            parts.append(f'{name} {new_stats["p50"]:.3f}ms ({change:+.1f}%)')
+        lines.append('  '.join(parts))
+
+    return lines
+
+
+def label_mismatches(samples=400, seed=0, frame_size=(300, 200)):
+    """
+    Positions, many of them cut by a frame border, where LabelCache.draw_text
+    paints something other than utils.draw_text, with the largest
+    difference. Empty when the cache is a true drop-in.
+    """
+    rng = np.random.default_rng(seed)
+    frame_width, frame_height = frame_size
+    background = rng.integers(0, 255, (frame_height, frame_width, 3), dtype=np.uint8)
+    labels = LabelCache()
+
+    mismatches = []
+    for _ in range(samples):
+        msg = 'INCORRECT: ' + str(rng.integers(0, 100))
+        pos = (int(rng.integers(-60, frame_width)), int(rng.integers(-30, frame_height)))
+        style = {'pos': pos, 'font_scale': 0.7, 'text_color': (255, 255, 230),
+                 'text_color_bg': (221, 0, 0)}
+
+        expected = background.copy()
+        draw_text(expected, msg, **style)
+        cached = background.copy()
+        labels.draw_text(cached, msg, **style)
+
+        diff = np.abs(expected.astype(np.int16) - cached.astype(np.int16))
+        if diff.any():
+            mismatches.append((pos, int(diff.max())))
+
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--exercise', choices=EXERCISES, action='append')
+    parser.add_argument('--resolution', choices=tuple(RESOLUTIONS), action='append')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--check-labels', action='store_true',
+                        help='check that cached labels match draw_text, then exit')
+    args = parser.parse_args()
+
+    if args.check_labels:
+        mismatches = label_mismatches(seed=args.seed)
+        for pos, diff in mismatches:
+            print(f'label at {pos} differs from draw_text by up to {diff}')
+        raise SystemExit(1 if mismatches else 0)
+
+    suite = run_suite(
+        args.exercise or EXERCISES, args.resolution or tuple(RESOLUTIONS),
+        args.frames, args.warmup, args.seed)
+
+    for result in suite['results']:
+        stages = '  '.join(f'{stage} {stats["p50"]:.3f}'
+                           for stage, stats in result['stage_ms'].items())
+        print(f"{result['exercise']:<24} {result['resolution']:>5}  "
+              f"{result['frames_per_second']:8.1f} fps  "
+              f"p50 {result['frame_ms']['p50']:.3f}ms  [{stages}]  "
+              f"peak {result['alloc_peak_kb']:.0f}KiB")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(suite, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        print('\n'.join(compare(suite, baseline)))
+
+
+if __name__ == '__main__':
+    main()
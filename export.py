@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from activity import Activity
+from pipeline import ActivityPipeline, video_frames
+from utils import get_mediapipe_pose
+
+
+# Marks the end of the frames to write.
+_END = object()
+
+
+class _Writer:
+    """
+    Encodes RGB frames on its own thread. Frames are converted into one
+    reused BGR buffer, so the writer allocates nothing per frame.
+    """
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        bgr = None
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is _END:
+                    return
+                bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=bgr)
+                self.writer.write(bgr)
+                self.written += 1
+        except Exception as exc:
+            self.error = exc
+
+    def put(self, frame):
+        while self._thread.is_alive():
+            try:
+                self.queue.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise self.error or RuntimeError('Video writer stopped')
+
+    def close(self):
+        if self._thread.is_alive():
+            self.put(_END)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        # Frames still queued are not worth encoding after a failure.
+        while self._thread.is_alive():
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(_END)
+            except queue.Full:
+                continue
+            break
+        self._thread.join()
+
+
+def export_video(
+    video_path,
+    out_path,
+    settings,
+    pose=None,
+    fourcc='mp4v',
+    queue_size=4,
+    on_progress=None,
+    **activity_kwargs
+):
+    """
+    Write the coached replay of a recorded set to `out_path`.
+
+    Decoding, pose inference, analysis with drawing, and encoding each run
+    on their own thread, joined by bounded queues (see ActivityPipeline),
+    and every frame lives in a FrameRing buffer that is reused once the
+    writer is done with it. Memory use therefore stays the same however
+    long the clip is.
+
+    Inactivity is timed on the clip's timeline. `pose` defaults to a fresh
+    MediaPipe model closed at the end. `on_progress(frames_done)` is called
+    from this thread after every frame. Returns the final counters together
+    with how fast the clip was processed: `fps` in source frames per second
+    and `speed` as seconds of video per second of processing.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f'Could not open video: {video_path}')
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                  int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    writer = cv2.VideoWriter(
+        out_path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+    if not writer.isOpened():
+        cap.release()
+        raise IOError(f'Could not open video writer: {out_path}')
+
+    own_pose = pose is None
+    if own_pose:
+        pose = get_mediapipe_pose()
+
+    activity_kwargs.setdefault('mute', True)
+    activity = Activity(settings, **activity_kwargs)
+    pipeline = ActivityPipeline(activity, pose, queue_size=queue_size)
+
+    # The writer's queue and the frame it is encoding hold ring buffers too.
+    ring = pipeline.frame_ring(extra=queue_size + 1)
+    output = _Writer(writer, queue_size)
+
+    frames = 0
+    start = time.perf_counter()
+    try:
+        for frame, _ in pipeline.run(video_frames(cap, ring, timestamps=True), timestamps=True):
+            output.put(frame)
+            frames += 1
+            if on_progress is not None:
+                on_progress(frames)
+        output.close()
+    except BaseException:
+        output.abort()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        writer.release()
+        cap.release()
+        if own_pose:
+            pose.close()
+
+    source_seconds = frames / fps
+    return {
+        'CORRECT_COUNT': activity.state_tracker.correct_count,
+        'INCORRECT_COUNT': activity.state_tracker.incorrect_count,
+        'frames': frames,
+        'source_seconds': source_seconds,
+        'elapsed': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else None,
+        'speed': source_seconds / elapsed if elapsed > 0 else None
+    }
@@ -0,0 +1,167 @@
+import json
+import threading
+from collections import deque
+
+import numpy as np
+
+
+# Per-frame stages whose latency Activity records.
+STAGES = ('inference', 'geometry', 'state', 'render')
+
+PERCENTILES = (50, 95, 99)
+
+
+class FrameMetrics:
+    """
+    Rolling frame rate and per-stage latency for one Activity.
+
+    Frame rate is taken from the frame timestamps given to `tick()`: an
+    exponentially weighted FPS that reacts quickly, and the FPS over the last
+    `window` frames. Frames that share a timestamp are folded into the next
+    interval, so a coarse clock cannot divide by zero.
+
+    Stage latencies are wall-clock seconds kept for the last `window` frames
+    and reported as p50/p95/p99 in milliseconds, next to the running sum and
+    count of every sample since the last reset. Recording is thread-safe,
+    so a pipeline's inference thread can report into the same instance.
+    """
+
+    def __init__(self, window=300, alpha=0.1):
+        self.window = window
+        self.alpha = alpha
+
+        self._lock = threading.Lock()
+        self._frame_times = deque(maxlen=window)
+        self._latencies = {stage: deque(maxlen=window) for stage in STAGES}
+        self._totals = {stage: [0.0, 0] for stage in STAGES}
+
+        self.frames = 0
+        self.ewma_fps = None
+        self._last_time = None
+        self._unrated = 0
+
+    def reset(self):
+        with self._lock:
+            self._frame_times.clear()
+            for samples in self._latencies.values():
+                samples.clear()
+            for stage in self._totals:
+                self._totals[stage] = [0.0, 0]
+            self.frames = 0
+            self.ewma_fps = None
+            self._last_time = None
+            self._unrated = 0
+
+    def tick(self, timestamp):
+        with self._lock:
+            self.frames += 1
+            self._frame_times.append(timestamp)
+
+            if self._last_time is None:
+                self._last_time = timestamp
+                return
+
+            self._unrated += 1
+            dt = timestamp - self._last_time
+            if dt <= 0:
+                return
+
+            fps = self._unrated / dt
+            if self.ewma_fps is None:
+                self.ewma_fps = fps
+            else:
+                self.ewma_fps += self.alpha * (fps - self.ewma_fps)
+
+            self._last_time = timestamp
+            self._unrated = 0
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self._latencies:
+                self._latencies[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0.0, 0]
+            self._latencies[stage].append(seconds)
+            totals = self._totals[stage]
+            totals[0] += seconds
+            totals[1] += 1
+
+    def windowed_fps(self):
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return None
+            span = self._frame_times[-1] - self._frame_times[0]
+            if span <= 0:
+                return None
+            return (len(self._frame_times) - 1) / span
+
+    def latency(self, stage):
+        """p50/p95/p99 of `stage` in milliseconds, None before any sample."""
+        with self._lock:
+            samples = np.array(self._latencies.get(stage, ()), dtype=np.float64)
+
+        if not len(samples):
+            return None
+
+        values = np.percentile(samples, PERCENTILES) * 1000.0
+        stats = {f'p{p}': float(v) for p, v in zip(PERCENTILES, values)}
+        stats['count'] = len(samples)
+        return stats
+
+    def total(self, stage):
+        """
+        `{'seconds', 'count'}` summed over every sample of `stage` since the
+        last reset, not just the window. None before any sample.
+        """
+        with self._lock:
+            seconds, count = self._totals.get(stage, (0.0, 0))
+
+        if not count:
+            return None
+        return {'seconds': seconds, 'count': count}
+
+    def snapshot(self):
+        with self._lock:
+            stages = list(self._latencies)
+            frames = self.frames
+            ewma_fps = self.ewma_fps
+
+        return {
+            'frames': frames,
+            'fps': {
+                'ewma': ewma_fps,
+                'window': self.windowed_fps()
+            },
+            'latency_ms': {stage: self.latency(stage) for stage in stages},
+            'latency_total': {stage: self.total(stage) for stage in stages}
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix='fitness'):
+        """The snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+
+        lines = [
+            f'# TYPE {prefix}_frames_total counter',
+            f'{prefix}_frames_total {snapshot["frames"]}',
+            f'# TYPE {prefix}_fps gauge'
+        ]
+        for kind, value in snapshot['fps'].items():
+            if value is not None:
+                lines.append(f'{prefix}_fps{{kind="{kind}"}} {value}')
+
+        lines.append(f'# TYPE {prefix}_stage_latency_seconds summary')
+        for stage, stats in snapshot['latency_ms'].items():
+            total = snapshot['latency_total'][stage]
+            if stats is None or total is None:
+                continue
+            for p in PERCENTILES:
+                lines.append(
+                    f'{prefix}_stage_latency_seconds{{stage="{stage}",quantile="{p / 100}"}} {stats[f"p{p}"] / 1000.0}')
+            lines.append(
+                f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {total["seconds"]}')
+            lines.append(
+                f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {total["count"]}')
+
+        return '\n'.join(lines) + '\n'
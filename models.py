@@ -0,0 +1,139 @@
+import sys
+import threading
+import time
+
+import numpy as np
+
+from utils import get_mediapipe_pose
+
+
+# Pose models shared by the whole process. Building a MediaPipe graph and
+# running its first frame take far longer than any later frame, and
+# Streamlit reruns the page script on every interaction, so models are
+# built once per set of parameters and handed out again afterwards.
+#
+# A model keeps tracking state between frames and must not be used by two
+# threads at once: callers that run in parallel, or that follow different
+# people, pass their own `key` to get their own model.
+
+_models = {}
+_lock = threading.Lock()
+
+# Seconds since this module was first imported at which each startup step
+# ended, and how long it took.
+_origin = time.perf_counter()
+_events = []
+
+
+def mark(event, seconds=None, once=False):
+    """
+    Record a startup milestone, optionally with how long it took. With
+    `once`, an event that was already recorded is left alone.
+    """
+    with _lock:
+        if once and any(recorded == event for recorded, _, _ in _events):
+            return
+        _events.append((event, time.perf_counter() - _origin, seconds))
+
+
+def startup_report():
+    """
+    The startup steps seen so far, in order: `{'event', 'at', 'took'}` with
+    `at` in seconds since startup and `took` the step's duration, if known.
+    """
+    with _lock:
+        return [{'event': event, 'at': at, 'took': took} for event, at, took in _events]
+
+
+_DEFAULTS = {
+    'static_image_mode': False,
+    'model_complexity': 1,
+    'smooth_landmarks': True,
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5
+}
+
+
+def _params(kwargs):
+    unknown = set(kwargs) - set(_DEFAULTS)
+    if unknown:
+        raise TypeError(f'Unknown pose parameters: {sorted(unknown)}')
+
+    params = dict(_DEFAULTS)
+    params.update(kwargs)
+    return params
+
+
+def _build(key, params, warm_up):
+    label = ', '.join([repr(key)] * (key is not None) + [
+        f'{name}={value}' for name, value in params.items() if value != _DEFAULTS[name]])
+
+    if 'mediapipe' not in sys.modules:
+        start = time.perf_counter()
+        import mediapipe  # noqa: F401
+        mark('import mediapipe', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pose = get_mediapipe_pose(**params)
+    mark(f'build pose({label})', time.perf_counter() - start)
+
+    if warm_up:
+        # The first frame initializes the graph; a blank frame takes that
+        # hit here instead of on the lifter's first frame.
+        start = time.perf_counter()
+        pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
+        mark(f'warm up pose({label})', time.perf_counter() - start)
+
+    return pose
+
+
+def build_pose(warm_up=True, **kwargs):
+    """
+    A new pose model for `get_mediapipe_pose(**kwargs)`, built and warmed up
+    but not shared: the caller owns it and closes it when done.
+    """
+    return _build(None, _params(kwargs), warm_up)
+
+
+def get_pose(key=None, warm_up=True, **kwargs):
+    """
+    The process-wide pose model for `get_mediapipe_pose(**kwargs)` and
+    `key`, built and warmed up on first use.
+    """
+    params = _params(kwargs)
+    cache_key = (key,) + tuple(params.items())
+
+    with _lock:
+        entry = _models.get(cache_key)
+        if entry is None:
+            entry = _models[cache_key] = {'ready': threading.Event(), 'pose': None, 'error': None}
+            owner = True
+        else:
+            owner = False
+
+    if owner:
+        try:
+            entry['pose'] = _build(key, params, warm_up)
+        except Exception as exc:
+            entry['error'] = exc
+            with _lock:
+                del _models[cache_key]
+            raise
+        finally:
+            entry['ready'].set()
+    else:
+        entry['ready'].wait()
+        if entry['error'] is not None:
+            raise entry['error']
+
+    return entry['pose']
+
+
+def release(key=None, **kwargs):
+    """Forget and close a model built by `get_pose`."""
+    cache_key = (key,) + tuple(_params(kwargs).items())
+    with _lock:
+        entry = _models.pop(cache_key, None)
+
+    if entry is not None and entry['pose'] is not None:
+        entry['pose'].close()
@@ -0,0 +1,247 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from utils import draw_text
+
+
+def _extent(msg, font, font_scale, font_thickness, box_offset):
+    # Extent of everything draw_text paints, relative to `pos`, with a
+    # margin for anti-aliasing, plus the text size it returns.
+    (text_w, text_h), baseline = cv2.getTextSize(
+        msg, font, font_scale, font_thickness)
+
+    pad = font_thickness + 2
+    left = -box_offset[0] - pad
+    top = min(-box_offset[1], -font_thickness) - pad
+    right = max(text_w + box_offset[0] - 25, -box_offset[0] + 6 + text_w) + pad
+    bottom = max(text_h + box_offset[1], text_h + baseline + font_thickness) + pad
+
+    return (left, top, right, bottom), (text_w, text_h)
+
+
+def _coverage(on_black, on_white):
+    # For a pixel with coverage a and color c: on_black = a * c and
+    # on_white = a * c + (1 - a) * 255.
+    alpha = 255 - (on_white[..., 0].astype(np.int16) -
+                   on_black[..., 0].astype(np.int16))
+    opaque = alpha >= 255
+    partial = np.nonzero((alpha > 0) & ~opaque)
+
+    return opaque.astype(np.uint8), partial, (alpha[partial] / 255.0)[:, None]
+
+
+class LabelCache:
+    """
+    Drop-in replacement for `utils.draw_text` that rasterizes every distinct
+    label once and pastes the cached sprite on later frames. Labels cut by
+    a border of the frame are drawn with `draw_text` itself.
+
+    Sprites are keyed on the text and every styling argument. Positions are
+    not part of the key: a sprite is drawn relative to `pos`. The cache is LRU
+    with `maxsize` entries, so dynamic labels such as counts and angles
+    recycle slots instead of growing it.
+
+    Each label is drawn once on a black and once on a white canvas. The
+    difference between the two gives the exact coverage of every pixel. Box
+    and text pixels inside the box are fully opaque and are copied
+    byte-for-byte as `draw_text` would draw them. Anti-aliased glyph edges
+    that stick out of the box are alpha-blended.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def clear(self):
+        self._sprites.clear()
+
+    def _render(self, msg, width, font, font_scale, font_thickness, text_color, text_color_bg, box_offset):
+        (left, top, right, bottom), text_size = _extent(
+            msg, font, font_scale, font_thickness, box_offset)
+
+        canvases = []
+        for fill in (0, 255):
+            canvas = np.full((bottom - top, right - left, 3), fill, dtype=np.uint8)
+            draw_text(canvas, msg, width=width, font=font, pos=(-left, -top), font_scale=font_scale,
+                      font_thickness=font_thickness, text_color=text_color, text_color_bg=text_color_bg,
+                      box_offset=box_offset)
+            canvases.append(canvas)
+
+        on_black, on_white = canvases
+        opaque, partial, partial_alpha = _coverage(on_black, on_white)
+
+        return {
+            'origin': (left, top),
+            'pixels': on_black,
+            'opaque': opaque,
+            'partial': partial,
+            'partial_pixels': on_black[partial],
+            'partial_alpha': partial_alpha,
+            'text_size': text_size
+        }
+
+    def _get(self, key):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._render(*key)
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.maxsize:
+                self._sprites.popitem(last=False)
+        else:
+            self._sprites.move_to_end(key)
+        return sprite
+
+    def draw_text(
+        self,
+        img,
+        msg,
+        width=8,
+        font=cv2.FONT_HERSHEY_SIMPLEX,
+        pos=(0, 0),
+        font_scale=1,
+        font_thickness=2,
+        text_color=(0, 255, 0),
+        text_color_bg=(0, 0, 0),
+        box_offset=(20, 10),
+    ):
+        sprite = self._get((msg, width, font, font_scale, font_thickness,
+                            tuple(text_color), tuple(text_color_bg), tuple(box_offset)))
+
+        pixels = sprite['pixels']
+        h, w = pixels.shape[:2]
+        x0 = int(pos[0]) + sprite['origin'][0]
+        y0 = int(pos[1]) + sprite['origin'][1]
+
+        # OpenCV anti-aliases differently where a label is cut by a frame
+        # border than on the sprite's canvas, so such labels are drawn
+        # directly.
+        if x0 < 0 or y0 < 0 or x0 + w > img.shape[1] or y0 + h > img.shape[0]:
+            return draw_text(img, msg, width=width, font=font, pos=pos, font_scale=font_scale,
+                             font_thickness=font_thickness, text_color=text_color,
+                             text_color_bg=text_color_bg, box_offset=box_offset)
+
+        # cv2.copyTo writes straight into the ROI view of the frame.
+        roi = img[y0:y0 + h, x0:x0 + w]
+        cv2.copyTo(pixels, sprite['opaque'], roi)
+
+        ys, xs = sprite['partial']
+        if len(ys):
+            blended = roi[ys, xs] * (1.0 - sprite['partial_alpha']) + \
+                sprite['partial_pixels']
+            roi[ys, xs] = np.clip(blended + 0.5, 0, 255).astype(img.dtype)
+
+        return sprite['text_size']
+
+
+def static_label(
+    msg,
+    pos,
+    width=8,
+    font=cv2.FONT_HERSHEY_SIMPLEX,
+    font_scale=1,
+    font_thickness=2,
+    text_color=(0, 255, 0),
+    text_color_bg=(0, 0, 0),
+    box_offset=(20, 10),
+):
+    """A `draw_text` call for HudLayer, as a hashable tuple."""
+    return (msg, (int(pos[0]), int(pos[1])), width, font, font_scale, font_thickness,
+            tuple(text_color), tuple(text_color_bg), tuple(box_offset))
+
+
+class HudLayer:
+    """
+    Composites the HUD labels that look the same from frame to frame, such
+    as feedback panels and banners, as one prerendered layer.
+
+    A layer is rendered once per frame size and set of `static_label`s and
+    kept in an LRU cache of `maxsize` entries. Drawing it is a single masked
+    copy of its opaque pixels plus one blend of its anti-aliased edges,
+    however many labels it holds, with the same coverage rules as
+    LabelCache. Labels that overlap are stacked in the order given, like
+    consecutive `draw_text` calls.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._layers = OrderedDict()
+
+    def __len__(self):
+        return len(self._layers)
+
+    def clear(self):
+        self._layers.clear()
+
+    def _render(self, frame_width, frame_height, labels):
+        # Union of the labels' extents, clipped to the frame.
+        x0, y0, x1, y1 = frame_width, frame_height, 0, 0
+        for msg, pos, _, font, font_scale, font_thickness, _, _, box_offset in labels:
+            (left, top, right, bottom), _ = _extent(
+                msg, font, font_scale, font_thickness, box_offset)
+            x0 = min(x0, pos[0] + left)
+            y0 = min(y0, pos[1] + top)
+            x1 = max(x1, pos[0] + right)
+            y1 = max(y1, pos[1] + bottom)
+
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(frame_width, x1), min(frame_height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+
+        canvases = []
+        for fill in (0, 255):
+            canvas = np.full((y1 - y0, x1 - x0, 3), fill, dtype=np.uint8)
+            for msg, pos, width, font, font_scale, font_thickness, text_color, text_color_bg, box_offset in labels:
+                draw_text(canvas, msg, width=width, font=font, pos=(pos[0] - x0, pos[1] - y0),
+                          font_scale=font_scale, font_thickness=font_thickness, text_color=text_color,
+                          text_color_bg=text_color_bg, box_offset=box_offset)
+            canvases.append(canvas)
+
+        on_black, on_white = canvases
+        opaque, partial, partial_alpha = _coverage(on_black, on_white)
+
+        return {
+            'rect': (x0, y0, x1, y1),
+            'pixels': on_black,
+            'opaque': opaque,
+            'partial': partial,
+            'partial_pixels': on_black[partial],
+            'partial_alpha': partial_alpha
+        }
+
+    def draw(self, img, labels):
+        """Draw `labels`, a tuple of `static_label`s, on `img` in place."""
+        if not labels:
+            return img
+
+        frame_height, frame_width = img.shape[:2]
+        key = (frame_width, frame_height, labels)
+
+        if key in self._layers:
+            layer = self._layers[key]
+            self._layers.move_to_end(key)
+        else:
+            layer = self._layers[key] = self._render(
+                frame_width, frame_height, labels)
+            if len(self._layers) > self.maxsize:
+                self._layers.popitem(last=False)
+
+        if layer is None:
+            return img
+
+        x0, y0, x1, y1 = layer['rect']
+        roi = img[y0:y1, x0:x1]
+        cv2.copyTo(layer['pixels'], layer['opaque'], roi)
+
+        ys, xs = layer['partial']
+        if len(ys):
+            blended = roi[ys, xs] * (1.0 - layer['partial_alpha']) + \
+                layer['partial_pixels']
+            roi[ys, xs] = np.clip(blended + 0.5, 0, 255).astype(img.dtype)
+
+        return img
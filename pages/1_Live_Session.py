@@ -0,0 +1,172 @@
+import threading
+
+import av
+import streamlit as st
+from streamlit_webrtc import VideoProcessorBase, WebRtcMode, webrtc_streamer
+
+import models
+import settings
+from activity import Activity
+
+
+EXERCISES = {
+    'Barbell Curl': settings.get_barbell_curl,
+    'Bent-Over Dumbbell Row': settings.get_bent_over_dumbbell_row,
+    'Weighted Squat': settings.get_squat_with_weights
+}
+
+# Landmark smoothing: MediaPipe's own, or one of smoothing.py's filters with
+# MediaPipe's turned off.
+SMOOTHING = {
+    'MediaPipe': None,
+    'One Euro': 'one_euro',
+    'Kalman': 'kalman',
+    'EMA': 'ema'
+}
+
+
+# Streamlit reruns this script on every interaction. Everything expensive is
+# built once per browser session and kept in st.session_state: the pose model
+# and the Activity (which holds the rep counts). MediaPipe tracks one person
+# from frame to frame, so every session builds its own model, and sessions
+# never wait on each other. The model is not in models' process-wide
+# registry: once a stream has used it, the CoachProcessor closes it when it
+# is replaced or the stream ends; a model no stream used is closed here or
+# goes away with the session. Visitors leave nothing behind.
+
+def get_pose(model_complexity, smooth_landmarks):
+    params = {'model_complexity': model_complexity,
+              'smooth_landmarks': smooth_landmarks}
+
+    if 'pose' in st.session_state and st.session_state['pose_params'] == params:
+        return st.session_state['pose'], None
+
+    with st.spinner('Loading the pose model...'):
+        pose = models.build_pose(**params)
+
+    # A model a stream has used is closed by its processor.
+    replaced = None
+    if not st.session_state.get('pose_streamed'):
+        replaced = st.session_state.get('pose')
+
+    st.session_state['pose'] = pose
+    st.session_state['pose_params'] = params
+    st.session_state['pose_streamed'] = False
+    return pose, replaced
+
+
+def get_activity(exercise, flip_frame, mute, smoothing):
+    config = (exercise, flip_frame, mute, smoothing)
+    if st.session_state.get('activity_config') != config:
+        st.session_state['activity'] = Activity(
+            EXERCISES[exercise](), flip_frame=flip_frame, mute=mute,
+            smoothing=SMOOTHING[smoothing])
+        st.session_state['activity_config'] = config
+    return st.session_state['activity']
+
+
+class CoachProcessor(VideoProcessorBase):
+    """
+    Runs on streamlit_webrtc's worker thread, never on the script thread, so
+    the page stays responsive while a frame is analyzed. Frames that arrived
+    while the previous one was being processed are dropped: only the newest
+    is coached, so feedback never lags behind the lifter.
+
+    The processor owns the model it is given: it closes a model once it is
+    replaced and the current one when the stream ends, never while a frame
+    is being analyzed with it.
+    """
+
+    def __init__(self, activity, pose):
+        self.activity = activity
+        self.pose = pose
+        self.dropped = 0
+
+        # Held while a frame is processed, so the script thread can swap in
+        # a new Activity or model between frames.
+        self.lock = threading.Lock()
+
+    def update(self, activity, pose):
+        with self.lock:
+            self.activity = activity
+            if self.pose is not None and pose is not self.pose:
+                self.pose.close()
+            self.pose = pose
+
+    def on_ended(self):
+        with self.lock:
+            if self.pose is not None:
+                self.pose.close()
+                self.pose = None
+
+    async def recv_queued(self, frames):
+        self.dropped += len(frames) - 1
+        frame = frames[-1]
+
+        image = frame.to_ndarray(format='rgb24')
+
+        with self.lock:
+            activity = self.activity
+            image, play_sound = activity.process(image, self.pose)
+
+        if play_sound is not None:
+            activity.play_sound(play_sound)
+
+        out = av.VideoFrame.from_ndarray(image, format='rgb24')
+        out.pts = frame.pts
+        out.time_base = frame.time_base
+        return [out]
+
+
+st.title('Live Session')
+
+exercise = st.sidebar.selectbox('Exercise', list(EXERCISES))
+flip_frame = st.sidebar.checkbox('Mirror the camera', value=True)
+audio_cues = st.sidebar.checkbox('Audio cues on this machine', value=False)
+model_complexity = st.sidebar.select_slider(
+    'Model accuracy', options=[0, 1, 2], value=1,
+    help='Higher is more accurate but slower.')
+smoothing = st.sidebar.selectbox(
+    'Landmark smoothing', list(SMOOTHING),
+    help='One Euro keeps the counts steady even at the lowest accuracy.')
+
+pose, replaced = get_pose(model_complexity, SMOOTHING[smoothing] is None)
+activity = get_activity(exercise, flip_frame, not audio_cues, smoothing)
+
+ctx = webrtc_streamer(
+    key='live-session',
+    mode=WebRtcMode.SENDRECV,
+    video_processor_factory=lambda: CoachProcessor(activity, pose),
+    media_stream_constraints={'video': True, 'audio': False},
+    async_processing=True
+)
+
+# Widgets changed while streaming: hand the running processor the new
+# objects instead of restarting the stream.
+if ctx.video_processor is not None:
+    ctx.video_processor.update(activity, pose)
+
+# A model replaced before any stream used it is closed here.
+if replaced is not None:
+    replaced.close()
+
+if ctx.state.playing:
+    st.session_state['pose_streamed'] = True
+
+# Once the stream stops, the processor has closed the model; the next start
+# builds a fresh one on the rerun it triggers.
+if st.session_state.get('playing') and not ctx.state.playing:
+    for key in ('pose', 'pose_params', 'pose_streamed'):
+        st.session_state.pop(key, None)
+st.session_state['playing'] = ctx.state.playing
+
+st.markdown(
+    f'**Correct:** {activity.state_tracker.correct_count} &nbsp; '
+    f'**Incorrect:** {activity.state_tracker.incorrect_count}')
+
+with st.expander('Performance'):
+    st.json({
+        'metrics': activity.metrics.snapshot(),
+        'dropped_frames': ctx.video_processor.dropped if ctx.video_processor else 0,
+        'startup': models.startup_report()
+    })
@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Marks the end of a stage's output.
+_END = object()
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class FrameRing:
+    """
+    A fixed set of frame buffers handed out in turn, so a capture loop
+    writes into the same memory over and over instead of allocating a new
+    frame every time. A slot is reused `size` frames later: size the ring
+    above the number of frames that can be alive at once.
+    """
+
+    def __init__(self, size):
+        self.frames = [None] * size
+        self._next = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def next(self, shape, dtype=np.uint8):
+        idx = self._next
+        self._next = (idx + 1) % len(self.frames)
+
+        frame = self.frames[idx]
+        if frame is None or frame.shape != shape or frame.dtype != dtype:
+            frame = self.frames[idx] = np.empty(shape, dtype=dtype)
+        return frame
+
+
+def video_frames(cap, ring=None, timestamps=False):
+    """
+    Yield RGB frames from an opened cv2.VideoCapture until it runs dry.
+    With `timestamps`, yield `(frame, seconds)` pairs instead, `seconds`
+    being the frame's presentation time in the clip.
+
+    With a FrameRing, frames are converted into its buffers and decoding
+    reuses a single BGR buffer, so the loop stops allocating once the ring
+    has filled.
+    """
+    bgr = None
+    while True:
+        ok, bgr = cap.read(bgr if ring is not None else None)
+        if not ok:
+            return
+
+        if ring is None:
+            frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        else:
+            frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=ring.next(bgr.shape, bgr.dtype))
+
+        if timestamps:
+            yield frame, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        else:
+            yield frame
+
+
+class ActivityPipeline:
+    """
+    Runs an Activity as three overlapping stages:
+
+        decode -> pose inference -> analysis + overlay rendering
+
+    Each stage runs on its own thread and hands frames to the next through a
+    bounded queue, so inference on frame N+1 overlaps with drawing frame N.
+    The pose estimator is only ever called from the inference thread, in
+    frame order, so MediaPipe's tracking state stays valid.
+
+    Every frame yielded by the source must be its own array while it is in
+    flight: the render stage draws on it in place. A FrameRing from
+    `frame_ring()` is large enough for that.
+    """
+
+    def __init__(self, activity, pose, queue_size=4):
+        self.activity = activity
+        self.pose = pose
+        self.queue_size = queue_size
+
+    def frame_ring(self, extra=0):
+        # Both queues full, a frame in each stage and the one the caller
+        # still holds, plus `extra` the caller keeps after that.
+        return FrameRing(2 * self.queue_size + 4 + extra)
+
+    def _put(self, q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self, frames, out_q, stop):
+        try:
+            for frame in frames:
+                if not self._put(out_q, frame, stop):
+                    return
+        except Exception as exc:
+            self._put(out_q, _StageError(exc), stop)
+            return
+        self._put(out_q, _END, stop)
+
+    def _infer(self, in_q, out_q, stop, timed):
+        while not stop.is_set():
+            try:
+                frame = in_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if frame is _END or isinstance(frame, _StageError):
+                self._put(out_q, frame, stop)
+                return
+
+            if timed:
+                frame, timestamp = frame
+            else:
+                timestamp = None
+
+            try:
+                pose_input = self.activity.pose_input(frame)
+                start = time.perf_counter()
+                keypoints = self.pose.process(pose_input)
+                self.activity.metrics.record(
+                    'inference', time.perf_counter() - start)
+            except Exception as exc:
+                self._put(out_q, _StageError(exc), stop)
+                return
+
+            if not self._put(out_q, (frame, keypoints, timestamp), stop):
+                return
+
+    def run(self, frames, timestamps=False):
+        """
+        Yield `(frame, play_sound)` for every frame in `frames`, in order.
+        With `timestamps`, `frames` yields `(frame, seconds)` pairs, e.g.
+        from `video_frames(cap, timestamps=True)`, and inactivity is timed
+        on those.
+        """
+        decoded = queue.Queue(self.queue_size)
+        inferred = queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        workers = [
+            threading.Thread(target=self._decode, args=(
+                frames, decoded, stop), daemon=True),
+            threading.Thread(target=self._infer, args=(
+                decoded, inferred, stop, timestamps), daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while True:
+                item = inferred.get()
+                if item is _END:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exc
+
+                frame, keypoints, timestamp = item
+                yield self.activity.process(
+                    frame, self.pose, keypoints=keypoints, timestamp=timestamp)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
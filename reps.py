@@ -0,0 +1,272 @@
+import numpy as np
+
+from activity import Activity
+from state import STATES, SEQS, SEQ_NEXT, SEQ_EMPTY, SEQ_S2, SEQ_COMPLETE
+from smoothing import smooth_track
+from utils import find_angles
+
+
+# Whole-clip rep counting for offline analysis. Every frame of a landmark
+# track is classified at once: angles with one find_angles call over the
+# (frames, points, 2) tensor, view and s1/s2/s3 stage with comparisons and
+# np.digitize, fault rules with broadcasting. Only the rep sequence and the
+# posture flag are carried from one run of equal (view, stage) frames to the
+# next, so the Python work left is per run rather than per frame.
+#
+# Counts, sound events and inactivity resets are the same as feeding the
+# landmarks through Activity.analyze() one frame at a time, see
+# batch.replay().
+
+_NONE, _FRONT, _SIDE = 0, 1, 2
+
+
+def _state_bins(ref_angle):
+    # np.digitize edges for the REF_ANGLE ranges. Angles are integers, so
+    # [lo, hi] is the bin [lo, hi + 1); the bins in between are gaps.
+    bands = sorted((ref_angle[key][0], ref_angle[key][1] + 1, code)
+                   for code, key in ((1, 'NORMAL'), (2, 'TRANS'), (3, 'PASS')))
+
+    edges = []
+    codes = [0]
+    for lo, hi, code in bands:
+        if edges and lo < edges[-1]:
+            raise ValueError('REF_ANGLE ranges must not overlap')
+        if edges and lo == edges[-1]:
+            codes[-1] = code
+        else:
+            edges.append(lo)
+            codes.append(code)
+        edges.append(hi)
+        codes.append(0)
+
+    return np.array(edges), np.array(codes, dtype=np.int8)
+
+
+def _runs(values):
+    # Run-length encoding: start index and length of every run of equal
+    # values.
+    starts = np.flatnonzero(np.diff(values)) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.concatenate((starts, [len(values)])))
+    return starts, lengths
+
+
+def _timer_resets(active, dt, thresh):
+    """
+    Frames where an inactivity timer reaches `thresh`. The timer adds the
+    time since the previous frame on every `active` frame, is cleared on
+    every other frame and restarts from zero after firing. Sums are taken
+    in frame order, exactly as Activity accumulates them.
+    """
+    fired = []
+    if not active.any():
+        return fired
+
+    starts, lengths = _runs(active)
+    total = np.cumsum(dt)
+    for start, length in zip(starts, lengths):
+        if not active[start]:
+            continue
+
+        stop = start + length
+        # Cheap upper bound first: most stretches are far too short.
+        if total[stop - 1] - total[start] + dt[start] < thresh - 1e-6:
+            continue
+
+        pos = start
+        while pos < stop:
+            hit = np.flatnonzero(np.cumsum(dt[pos:stop]) >= thresh)
+            if not len(hit):
+                break
+            fired.append(pos + hit[0])
+            pos += hit[0] + 1
+
+    return fired
+
+
+def _classify(landmarks, activity, frame_width, frame_height):
+    # View, stage and fault rule firing for every frame.
+    exercise = activity.exercise
+    spec = exercise['angles']
+    settings = activity.settings
+
+    frames = len(landmarks)
+    detected = ~np.isnan(landmarks[:, 0, 0])
+
+    xy = np.where(detected[:, None, None], landmarks[:, :, :2], 0.0)
+    coords = np.multiply(xy, (frame_width, frame_height), dtype=np.float64)
+    coords = coords.astype(np.int64).astype(np.float64)
+
+    # The 'vertical' helper points sit straight above a joint, on the top
+    # edge of the frame.
+    vertical = np.zeros((frames, len(spec['vertical_src']), 2))
+    vertical[:, :, 0] = coords[:, spec['vertical_src'], 0] + spec['vertical_dx']
+    points = np.concatenate((coords, vertical), axis=1)
+
+    angles = find_angles(
+        points[:, spec['p1']], points[:, spec['p2']], points[:, spec['ref']])
+
+    # Same side choice as Activity._left_faces_camera.
+    (left_a, left_b), (right_a, right_b) = exercise['side_dist']
+    dist_left = np.abs(coords[:, left_a, 1] - coords[:, left_b, 1])
+    dist_right = np.abs(coords[:, right_a, 1] - coords[:, right_b, 1])
+    left = dist_left > dist_right
+
+    names = spec['names']
+    n = len(names)
+    side_angles = np.where(left[:, None], angles[:, 1:n + 1], angles[:, n + 1:])
+    column = {name: idx for idx, name in enumerate(names)}
+
+    view = np.full(frames, _NONE, dtype=np.int8)
+    view[detected] = _SIDE
+    view[detected & (angles[:, 0] > settings['OFFSET_THRESH'])] = _FRONT
+
+    edges, codes = _state_bins(settings['REF_ANGLE'])
+    state = codes[np.digitize(side_angles[:, column[exercise['state_angle']]], edges)]
+    state[view != _SIDE] = 0
+
+    in_range = np.empty((frames, len(exercise['rules'])), dtype=bool)
+    for idx, (angle, above, below, *_) in enumerate(exercise['rules']):
+        values = side_angles[:, column[angle]]
+        in_range[:, idx] = (above < values) & (values < below)
+
+    return view, state, in_range
+
+
+def _posture_faults(activity, state, in_range):
+    """
+    For every rep sequence in SEQS, whether the fault rules mark each frame
+    as incorrect posture when checked with that sequence.
+    """
+    exercise = activity.exercise
+    rules = exercise['rules']
+    incorrect = np.array([rule[4] for rule in rules], dtype=bool)
+
+    skipped = np.zeros(len(state), dtype=bool)
+    for code, name in enumerate(STATES):
+        if name in exercise['skip_states']:
+            skipped |= state == code
+
+    faults = []
+    for seq in SEQS:
+        allowed = np.array([
+            seq_count is None or seq.count(seq_count[0]) == seq_count[1]
+            for *_, seq_count in rules], dtype=bool)
+        fires = in_range & allowed
+
+        if exercise['exclusive']:
+            # Only the first rule that fires is applied.
+            fires &= np.cumsum(fires, axis=1) == 1
+
+        flagged = (fires & incorrect).any(axis=1)
+        flagged[skipped] = False
+        faults.append(flagged)
+
+    return faults
+
+
+def count_reps(landmarks, settings, frame_width, frame_height, timestamps=None, fps=30.0, smoothing=None):
+    """
+    Vectorized `batch.replay`: the same CORRECT/INCORRECT counts and sound
+    events for a (frames, 33, 4) landmark array, NaN where nobody was
+    detected, computed for the whole clip in one pass. With `smoothing` the
+    raw track is filtered first, as `Activity(smoothing=...)` does live.
+    """
+    landmarks = np.asarray(landmarks)
+    frames = len(landmarks)
+
+    if timestamps is None:
+        timestamps = np.arange(frames) / fps
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    if smoothing is not None:
+        landmarks = smooth_track(landmarks, timestamps, smoothing)
+
+    result = {'CORRECT_COUNT': 0, 'INCORRECT_COUNT': 0, 'events': []}
+    if not frames:
+        return result
+
+    activity = Activity(settings, mute=True)
+    thresh = settings['INACTIVE_THRESH']
+
+    view, state, in_range = _classify(
+        landmarks, activity, frame_width, frame_height)
+    faults = _posture_faults(activity, state, in_range)
+
+    # Time since the previous frame; the first frame starts the timers.
+    dt = np.diff(timestamps, prepend=timestamps[0])
+
+    # The side view timer runs while nobody is detected and while the stage
+    # stays what it was on the previous side view frame. The front view
+    # timer runs while the lifter faces the camera.
+    side = view == _SIDE
+    prev_state = np.zeros(frames, dtype=np.int8)
+    prev_state[1:] = np.where(side[:-1], state[:-1], 0)
+    side_timer = (view == _NONE) | (side & (state == prev_state))
+
+    # Both timers zero the counters, but only the side view one plays the
+    # reset cue.
+    resets = np.zeros(frames, dtype=bool)
+    resets[_timer_resets(side_timer, dt, thresh)] = True
+    silent_resets = np.zeros(frames, dtype=bool)
+    silent_resets[_timer_resets(view == _FRONT, dt, thresh)] = True
+
+    # Rep sequence and posture flag, carried run by run.
+    correct = np.zeros(frames, dtype=bool)
+    incorrect = np.zeros(frames, dtype=bool)
+
+    seq = SEQ_EMPTY
+    posture = False
+    key = view.astype(np.int16) * 4 + state
+    starts, lengths = _runs(key)
+    for start, length, run_view, run_state in zip(
+            starts.tolist(), lengths.tolist(), view[starts].tolist(), state[starts].tolist()):
+        stop = start + length
+
+        if run_view == _NONE:
+            posture = False
+            continue
+
+        if run_view == _FRONT:
+            continue
+
+        if run_state == 1:
+            # The first frame closes the rep. Each later one counts as
+            # incorrect if the frame before it broke a posture rule.
+            if seq == SEQ_COMPLETE and not posture:
+                correct[start] = True
+            elif seq == SEQ_S2 or posture:
+                incorrect[start] = True
+
+            flagged = faults[SEQ_EMPTY]
+            incorrect[start + 1:stop] = flagged[start:stop - 1]
+            seq = SEQ_EMPTY
+            posture = bool(flagged[stop - 1])
+            continue
+
+        if run_state:
+            seq = SEQ_NEXT[STATES[run_state]][seq]
+        posture = posture or bool(faults[seq][start:stop].any())
+
+    # Replay the sparse events for the running totals and sounds.
+    counts = [0, 0]
+    for idx in np.flatnonzero(correct | incorrect | resets | silent_resets).tolist():
+        if silent_resets[idx]:
+            counts = [0, 0]
+            continue
+
+        if correct[idx]:
+            counts[0] += 1
+            sound = str(counts[0])
+        elif incorrect[idx]:
+            counts[1] += 1
+            sound = 'incorrect'
+
+        if resets[idx]:
+            counts = [0, 0]
+            sound = 'reset_counters'
+
+        result['events'].append((idx, sound))
+
+    result['CORRECT_COUNT'], result['INCORRECT_COUNT'] = counts
+    return result
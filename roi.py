@@ -0,0 +1,146 @@
+import cv2
+import numpy as np
+
+from utils import PoseResult, get_landmark_buffer
+
+
+class RoiPose:
+    """
+    Wraps a pose estimator so it only sees the part of the frame around the
+    lifter, downscaled to at most `max_side` pixels on its long side.
+
+    The region is the bounding box of the previous frame's visible
+    landmarks, grown by `margin` times its larger side in every direction.
+    Landmarks found in the crop are mapped back to full-frame normalized
+    coordinates, so callers cannot tell the difference. The region is kept
+    while the body stays well inside it, which spares the estimator's own
+    tracking and smoothing from a crop that shifts every frame. When nobody
+    is found in the crop the same frame is retried in full.
+
+    Frames are expected to be RGB, like for the wrapped estimator.
+
+    It wraps a single-person estimator with a `process(frame)` method, such
+    as MediaPipe's Pose, and is itself passed as the `pose` of an Activity
+    or an ActivityPipeline. The region belongs to one lifter, so a RoiPose
+    must not be shared between streams, e.g. built by a PoseServer
+    `pose_factory`: every stream would be cropped to another lifter's
+    region, miss and pay for a second, full-frame inference.
+    """
+
+    def __init__(self, pose, margin=0.25, max_side=512, min_visibility=0.5, interpolation=cv2.INTER_AREA):
+        self.pose = pose
+        self.margin = margin
+        self.max_side = max_side
+        self.min_visibility = min_visibility
+        self.interpolation = interpolation
+
+        # (x0, y0, x1, y1) in pixels, None to use the full frame.
+        self.roi = None
+
+        self.lost = 0
+        self._resized = None
+
+    def reset(self):
+        self.roi = None
+
+    def close(self):
+        close = getattr(self.pose, 'close', None)
+        if close is not None:
+            close()
+
+    def _run(self, frame, roi):
+        frame_height, frame_width = frame.shape[:2]
+        x0, y0, x1, y1 = roi if roi is not None else (
+            0, 0, frame_width, frame_height)
+
+        crop = frame[y0:y1, x0:x1]
+        crop_w, crop_h = x1 - x0, y1 - y0
+
+        scale = self.max_side / max(crop_w, crop_h)
+        if scale < 1.0:
+            size = (max(1, int(crop_w * scale)), max(1, int(crop_h * scale)))
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty(
+                    (size[1], size[0]) + crop.shape[2:], dtype=crop.dtype)
+            crop = cv2.resize(crop, size, dst=self._resized,
+                              interpolation=self.interpolation)
+        elif roi is not None:
+            crop = np.ascontiguousarray(crop)
+
+        keypoints = self.pose.process(crop)
+
+        if isinstance(keypoints, PoseResult):
+            landmarks = keypoints.landmarks
+            if landmarks is not None:
+                landmarks = landmarks.copy()
+        elif keypoints.pose_landmarks:
+            landmarks = get_landmark_buffer(keypoints.pose_landmarks.landmark)
+        else:
+            landmarks = None
+
+        if landmarks is None or roi is None:
+            return landmarks
+
+        # Crop-normalized to frame-normalized. z shares the scale of x.
+        landmarks[:, 0] = (x0 + landmarks[:, 0] * crop_w) / frame_width
+        landmarks[:, 1] = (y0 + landmarks[:, 1] * crop_h) / frame_height
+        landmarks[:, 2] *= crop_w / frame_width
+
+        return landmarks
+
+    def _fit(self, landmarks, frame_width, frame_height):
+        # Pixel bounding box of the landmarks that can be seen, or of all of
+        # them if too few can.
+        visible = landmarks[landmarks[:, 3] >= self.min_visibility]
+        if len(visible) < 4:
+            visible = landmarks
+
+        xs = visible[:, 0] * frame_width
+        ys = visible[:, 1] * frame_height
+        return xs.min(), ys.min(), xs.max(), ys.max()
+
+    def _update_roi(self, landmarks, frame_width, frame_height):
+        bx0, by0, bx1, by1 = self._fit(landmarks, frame_width, frame_height)
+        pad = self.margin * max(bx1 - bx0, by1 - by0, 1.0)
+
+        if self.roi is not None:
+            # Keep the region while the body sits at least half a margin
+            # inside it and still fills a fair share of it.
+            x0, y0, x1, y1 = self.roi
+            inner = pad / 2
+            inside = x0 + inner <= bx0 and y0 + inner <= by0 and \
+                bx1 <= x1 - inner and by1 <= y1 - inner
+            roi_area = (x1 - x0) * (y1 - y0)
+            want_area = (bx1 - bx0 + 2 * pad) * (by1 - by0 + 2 * pad)
+            if inside and roi_area <= 2 * want_area:
+                return
+
+        x0 = int(max(0, bx0 - pad))
+        y0 = int(max(0, by0 - pad))
+        x1 = int(min(frame_width, np.ceil(bx1 + pad)))
+        y1 = int(min(frame_height, np.ceil(by1 + pad)))
+
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            self.roi = None
+        else:
+            self.roi = (x0, y0, x1, y1)
+
+    def process(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+
+        landmarks = None
+        if self.roi is not None:
+            landmarks = self._run(frame, self.roi)
+            if landmarks is None:
+                # Tracking lost: look at the whole frame again.
+                self.lost += 1
+                self.roi = None
+
+        if landmarks is None:
+            landmarks = self._run(frame, None)
+
+        if landmarks is None:
+            return PoseResult()
+
+        self._update_roi(landmarks, frame_width, frame_height)
+        return PoseResult(landmarks)
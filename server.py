@@ -0,0 +1,260 @@
+import queue
+import threading
+import time
+from collections import deque
+
+from activity import Activity
+from utils import get_mediapipe_pose
+
+
+class StreamSession:
+    """
+    One camera on the floor: its own Activity (all rep state lives there) and
+    the frames waiting for a pose estimator.
+
+    At most `max_pending` frames wait per stream. When a station submits
+    faster than it is served, its oldest waiting frame is dropped: a lifter
+    needs feedback on what they are doing now, not on a backlog.
+    """
+
+    def __init__(self, stream_id, activity, max_pending, on_result):
+        self.stream_id = stream_id
+        self.activity = activity
+        self.on_result = on_result
+
+        self.pending = deque(maxlen=max_pending)
+
+        # (frame, play_sound) for callers that poll instead of passing
+        # on_result. Bounded like `pending`, oldest results go first.
+        self.results = queue.Queue(max_pending)
+
+        # Set while one of the stream's frames is out with a worker, or
+        # while the stream sits in the run queue.
+        self.busy = False
+        self.scheduled = False
+
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _deliver(self, frame, play_sound):
+        if self.on_result is not None:
+            self.on_result(self, frame, play_sound)
+            return
+
+        while True:
+            try:
+                self.results.put_nowait((frame, play_sound))
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get_result(self, timeout=None):
+        """Next `(frame, play_sound)`; raises queue.Empty on timeout."""
+        return self.results.get(timeout=timeout)
+
+
+class PoseServer:
+    """
+    Coaches many camera streams from one process with a fixed pool of pose
+    estimators.
+
+    Every stream keeps its own Activity, but `pool_size` worker threads, each
+    owning one estimator, share the inference work. Streams with waiting
+    frames are served round-robin and only one frame per stream is in flight
+    at a time. That keeps each stream's frames in order and its Activity
+    single-threaded, and a busy station gets at most one turn per round, so
+    it cannot starve the others.
+
+    An estimator serves many people, so tracking from one frame to the next
+    would mix them up: by default estimators are built with
+    static_image_mode=True. Pass `pose_factory` to build them differently,
+    but not as anything that follows one person, such as roi.RoiPose.
+
+    Activities are muted unless `mute=False` is given to `add_stream`, since
+    the process has a single audio mixer. Rep cues come back with every
+    frame, and posture cues can be routed by passing `audio=` an object with
+    a `play(cue)` method.
+    """
+
+    def __init__(self, pool_size=4, max_pending=2, pose_factory=None, pose_kwargs=None):
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+
+        if pose_factory is None:
+            kwargs = {'static_image_mode': True}
+            kwargs.update(pose_kwargs or {})
+
+            def pose_factory():
+                return get_mediapipe_pose(**kwargs)
+
+        self._pose_factory = pose_factory
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._sessions = {}
+        self._run_queue = deque()
+        self._workers = []
+        self._stopping = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            self._stopping = False
+            self._workers = [
+                threading.Thread(target=self._work, daemon=True)
+                for _ in range(self.pool_size)
+            ]
+        for worker in self._workers:
+            worker.start()
+
+    def close(self):
+        with self._ready:
+            self._stopping = True
+            self._ready.notify_all()
+
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    @property
+    def streams(self):
+        with self._lock:
+            return dict(self._sessions)
+
+    def add_stream(self, stream_id, settings, on_result=None, **activity_kwargs):
+        """
+        Register a camera coached with `settings`. `on_result(session, frame,
+        play_sound)` is called from a worker thread for every processed frame
+        and should return quickly; without it, poll `session.get_result()`.
+        """
+        activity_kwargs.setdefault('mute', True)
+        session = StreamSession(
+            stream_id, Activity(settings, **activity_kwargs), self.max_pending, on_result)
+
+        with self._lock:
+            if stream_id in self._sessions:
+                raise ValueError(f'Stream {stream_id!r} is already registered')
+            self._sessions[stream_id] = session
+
+        return session
+
+    def remove_stream(self, stream_id):
+        with self._lock:
+            session = self._sessions.pop(stream_id)
+            session.pending.clear()
+            if session.scheduled:
+                self._run_queue.remove(session)
+                session.scheduled = False
+        return session
+
+    def submit(self, stream_id, frame, timestamp=None):
+        """
+        Queue an RGB frame of a stream. Returns False when an older waiting
+        frame had to be dropped to make room.
+
+        The timestamp defaults to the stream's clock at submission, so
+        inactivity is timed on capture rather than on when a worker got to
+        the frame.
+        """
+        with self._ready:
+            session = self._sessions[stream_id]
+
+            if timestamp is None:
+                timestamp = session.activity.clock()
+
+            accepted = len(session.pending) < session.pending.maxlen
+            if not accepted:
+                session.dropped += 1
+
+            session.pending.append((frame, timestamp))
+            session.submitted += 1
+
+            if not session.busy and not session.scheduled:
+                session.scheduled = True
+                self._run_queue.append(session)
+                self._ready.notify()
+
+        return accepted
+
+    def cancel_pending(self, stream_id):
+        """Drop the frames of a stream still waiting for a worker."""
+        with self._lock:
+            session = self._sessions[stream_id]
+            dropped = len(session.pending)
+            session.pending.clear()
+            session.dropped += dropped
+            if session.scheduled:
+                self._run_queue.remove(session)
+                session.scheduled = False
+        return dropped
+
+    def _next(self):
+        with self._ready:
+            while not self._run_queue and not self._stopping:
+                self._ready.wait()
+
+            if self._stopping:
+                return None, None
+
+            session = self._run_queue.popleft()
+            session.scheduled = False
+            session.busy = True
+
+            return session, session.pending.popleft()
+
+    def _release(self, session):
+        with self._ready:
+            session.busy = False
+            if session.pending and self._sessions.get(session.stream_id) is session:
+                session.scheduled = True
+                self._run_queue.append(session)
+                self._ready.notify()
+
+    def _work(self):
+        pose = self._pose_factory()
+
+        try:
+            while True:
+                session, item = self._next()
+                if session is None:
+                    return
+
+                frame, timestamp = item
+                activity = session.activity
+
+                try:
+                    pose_input = activity.pose_input(frame)
+                    start = time.perf_counter()
+                    keypoints = pose.process(pose_input)
+                    activity.metrics.record(
+                        'inference', time.perf_counter() - start)
+
+                    frame, play_sound = activity.process(
+                        frame, pose, keypoints=keypoints, timestamp=timestamp)
+                    session.processed += 1
+                    session._deliver(frame, play_sound)
+                except Exception as exc:
+                    # One bad frame or callback must not take the other
+                    # stations down with it.
+                    session.errors += 1
+                    session.last_error = exc
+                finally:
+                    self._release(session)
+        finally:
+            close = getattr(pose, 'close', None)
+            if close is not None:
+                close()
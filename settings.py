@@ -1,3 +1,33 @@
+# Every exercise is described by data only; Activity compiles it once.
+#
+#   'ANGLES'        joint angles as (name, p1, p2, ref_pt), taken at ref_pt.
+#                   Points are joint names ('ear', 'shoulder', 'elbow',
+#                   'wrist', 'hip', 'knee', 'ankle', 'foot') or
+#                   ('vertical', joint, dx) for the point straight above
+#                   joint, shifted by dx pixels.
+#   'STATE_ANGLE'   the angle whose REF_ANGLE range gives the stage s1/s2/s3.
+#   'JOINTS'        joints reported in the result and drawn as points.
+#   'SIDE_DIST'     two joints; the side where they are further apart
+#                   vertically is the one facing the camera.
+#   'FAULTS'        posture rules, checked in order outside SKIP_STATES. A
+#                   rule fires when `above` < angle < `below` (either bound
+#                   may be left out) and, with 'seq_count': (state, n), the
+#                   rep so far holds that state n times. It shows its
+#                   'feedback' id, marks the rep incorrect unless
+#                   'incorrect' is False, and the first fired rule with a
+#                   'sound' plays it. EXCLUSIVE stops at the first rule that
+#                   fires. Bounds may name a setting, or (setting, index).
+#   'OVERLAY'       side view drawing, in order:
+#                   GUIDES  ('arc', joint, radius, start, end, direction, angle)
+#                           draws an arc from start to end + direction *
+#                           angle, mirrored for the left side, and
+#                           ('vertical', joint, above, below) a dotted
+#                           vertical line through joint.
+#                   LINKS   joint pairs joined by a line.
+#                   LABELS  (angle, joint, dx, dx_flipped, dy) angle values
+#                           written next to a joint.
+
+
 def get_barbell_curl():
     # Define the angle ranges for wrist-elbow-vertical alignment
     _ANGLE_WRIST_ELBOW_VERT = {
@@ -15,6 +45,34 @@ def get_barbell_curl():
         'OFFSET_THRESH': 80.0,
         'INACTIVE_THRESH': 10.0,
         'CNT_FRAME_THRESH': 50,
+        'ANGLES': [
+            ('wrist_shldr_elbow', 'wrist', 'shoulder', 'elbow'),
+            ('hip_vertical', 'shoulder', ('vertical', 'hip', 0), 'hip')
+        ],
+        'STATE_ANGLE': 'wrist_shldr_elbow',
+        'JOINTS': ('shoulder', 'elbow', 'wrist', 'hip'),
+        'SIDE_DIST': ('hip', 'shoulder'),
+        'FAULTS': {
+            # Swinging the hips is checked in every stage of the curl.
+            'SKIP_STATES': (),
+            'EXCLUSIVE': False,
+            'RULES': [
+                {'angle': 'hip_vertical', 'above': 'HIP_THRESH',
+                    'feedback': 0, 'sound': 'Barbellcurl_1'}
+            ]
+        },
+        'OVERLAY': {
+            'GUIDES': [
+                ('arc', 'elbow', 15, -120, -90, -1, 'wrist_shldr_elbow'),
+                ('arc', 'shoulder', 30, -90, -90, 1, 'hip_vertical'),
+                ('vertical', 'hip', 50, 0)
+            ],
+            'LINKS': [('shoulder', 'elbow'), ('wrist', 'elbow'), ('shoulder', 'hip')],
+            'LABELS': [
+                ('wrist_shldr_elbow', 'elbow', 15, 55, 10),
+                ('hip_vertical', 'hip', 15, 20, 0)
+            ]
+        },
         'FEEDBACK_ID_MAP': {
             
             0: {
@@ -52,6 +110,45 @@ def get_bent_over_dumbbell_row():
         'OFFSET_THRESH': 55.0,
         'INACTIVE_THRESH': 10.0,
         'CNT_FRAME_THRESH': 50,
+        'ANGLES': [
+            ('elbow_hip_shldr', 'elbow', 'hip', 'shoulder'),
+            ('hip_vertical', ('vertical', 'hip', 0), 'shoulder', 'hip'),
+            ('ankle_vertical', 'knee', ('vertical', 'ankle', 0), 'ankle'),
+            ('ear_hip_shldr', 'ear', 'hip', 'shoulder')
+        ],
+        'STATE_ANGLE': 'elbow_hip_shldr',
+        'JOINTS': ('ear', 'shoulder', 'elbow', 'wrist', 'hip', 'knee', 'ankle', 'foot'),
+        'SIDE_DIST': ('foot', 'hip'),
+        'FAULTS': {
+            'SKIP_STATES': ('s1',),
+            'EXCLUSIVE': False,
+            # Listed in the order their cues take precedence.
+            'RULES': [
+                {'angle': 'ankle_vertical', 'above': 'ANKLE_THRESH',
+                    'feedback': 1, 'sound': 'Bentover_1'},
+                {'angle': 'ear_hip_shldr', 'below': 'SHLDR_THRESH',
+                    'feedback': 2, 'sound': 'Bentover_2'},
+                {'angle': 'hip_vertical', 'below': 'HIP_THRESH',
+                    'feedback': 0, 'sound': 'Bentover_0'}
+            ]
+        },
+        'OVERLAY': {
+            'GUIDES': [
+                ('arc', 'shoulder', 30, 45, 45, -1, 'elbow_hip_shldr'),
+                ('arc', 'hip', 30, -90, -90, 1, 'hip_vertical'),
+                ('vertical', 'hip', 50, 0),
+                ('arc', 'ankle', 30, -90, -90, 1, 'ankle_vertical'),
+                ('vertical', 'ankle', 50, 20)
+            ],
+            'LINKS': [
+                ('ear', 'shoulder'), ('shoulder', 'elbow'), ('wrist', 'elbow'), ('shoulder', 'hip'),
+                ('knee', 'hip'), ('ankle', 'knee'), ('ankle', 'foot')
+            ],
+            'LABELS': [
+                ('ear_hip_shldr', 'shoulder', 15, 15, 10),
+                ('hip_vertical', 'hip', 15, 15, 10)
+            ]
+        },
         'FEEDBACK_ID_MAP': {
             0: {
                 'msg': 'LOWER YOUR TORSO',
@@ -94,6 +191,39 @@ def get_squat_with_weights():
         'OFFSET_THRESH': 55.0,
         'INACTIVE_THRESH': 10.0,
         'CNT_FRAME_THRESH': 50,
+        'ANGLES': [
+            ('knee_vertical', 'hip', ('vertical', 'knee', 0.1), 'knee'),
+            ('ankle_vertical', 'knee', ('vertical', 'ankle', 0.1), 'ankle')
+        ],
+        'STATE_ANGLE': 'knee_vertical',
+        'JOINTS': ('hip', 'knee', 'ankle', 'foot'),
+        'SIDE_DIST': ('foot', 'hip'),
+        'FAULTS': {
+            'SKIP_STATES': ('s1',),
+            'EXCLUSIVE': True,
+            'RULES': [
+                # Halfway up on the way back: only a hint, not a fault.
+                {'angle': 'knee_vertical', 'above': ('KNEE_THRESH', 0), 'below': ('KNEE_THRESH', 1),
+                    'seq_count': ('s2', 1), 'feedback': 0, 'incorrect': False},
+                {'angle': 'knee_vertical', 'above': ('KNEE_THRESH', 2),
+                    'feedback': 2, 'sound': 'Squat_2'},
+                {'angle': 'ankle_vertical', 'above': 'ANKLE_THRESH',
+                    'feedback': 1, 'sound': 'Squat_1'}
+            ]
+        },
+        'OVERLAY': {
+            'GUIDES': [
+                ('arc', 'knee', 20, -90, -90, -1, 'knee_vertical'),
+                ('vertical', 'knee', 50, 20),
+                ('arc', 'ankle', 30, -90, -90, 1, 'ankle_vertical'),
+                ('vertical', 'ankle', 50, 20)
+            ],
+            'LINKS': [('knee', 'hip'), ('ankle', 'knee'), ('ankle', 'foot')],
+            'LABELS': [
+                ('knee_vertical', 'knee', 15, 15, 10),
+                ('ankle_vertical', 'ankle', 10, 10, 0)
+            ]
+        },
         'FEEDBACK_ID_MAP': {
             0: {
                 'msg': 'RISE UP',
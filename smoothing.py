@@ -0,0 +1,189 @@
+import math
+
+import numpy as np
+
+
+# Temporal smoothing of the (33, 2) normalized landmark positions, applied
+# by an Activity before any geometry. The counters compare integer joint
+# angles against REF_ANGLE bands, so landmark jitter near a band edge flips
+# the stage back and forth; a filter here keeps it steady and lets MediaPipe
+# run with `smooth_landmarks=False` and a lighter `model_complexity`.
+#
+# Every filter keeps a fixed amount of state and costs a few vectorized
+# operations over the 66 coordinates per frame. `smooth(xy, timestamp)`
+# returns the filtered positions in a buffer the next call overwrites, and
+# `reset()` forgets the track, e.g. when nobody was detected. z and
+# visibility are left as they are.
+
+
+class EmaFilter:
+    """Exponential moving average: `alpha` of each new frame, per frame."""
+
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self._x = None
+
+    def reset(self):
+        self._x = None
+
+    def smooth(self, xy, timestamp):
+        if self._x is None:
+            self._x = np.array(xy, dtype=np.float64)
+            return self._x
+
+        self._x += self.alpha * (xy - self._x)
+        return self._x
+
+
+def _smoothing_factor(elapsed, cutoff):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / elapsed)
+
+
+class OneEuroFilter:
+    """
+    One Euro filter (Casiez et al., CHI 2012): a low-pass filter whose
+    cutoff frequency, in Hz, rises with each coordinate's speed, from
+    `min_cutoff` at rest by `beta` per unit of normalized speed. Slow
+    movement is smoothed heavily, fast movement lags little. Speeds are
+    themselves low-passed at `d_cutoff`.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+        self._x = None
+        self._dx = None
+        self._time = None
+
+    def reset(self):
+        self._x = None
+        self._dx = None
+        self._time = None
+
+    def smooth(self, xy, timestamp):
+        if self._x is None:
+            self._x = np.array(xy, dtype=np.float64)
+            self._dx = np.zeros_like(self._x)
+            self._time = timestamp
+            return self._x
+
+        elapsed = timestamp - self._time
+        if elapsed <= 0:
+            return self._x
+        self._time = timestamp
+
+        speed = (xy - self._x) / elapsed
+        self._dx += _smoothing_factor(elapsed, self.d_cutoff) * (speed - self._dx)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        self._x += _smoothing_factor(elapsed, cutoff) * (xy - self._x)
+        return self._x
+
+
+class KalmanFilter:
+    """
+    Constant-velocity Kalman filter on every coordinate. `measurement_noise`
+    is the variance of a detection, in normalized units squared, and
+    `process_noise` the spectral density of the acceleration the model
+    leaves out. Raising the ratio of the two follows the detections more
+    closely.
+
+    All coordinates share the frame times and the noise model, so they
+    share one covariance matrix: only positions and velocities are arrays.
+    """
+
+    def __init__(self, process_noise=0.05, measurement_noise=2.5e-5, initial_velocity_var=1.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.initial_velocity_var = initial_velocity_var
+
+        self._x = None
+        self._v = None
+        self._time = None
+        self._cov = None
+
+    def reset(self):
+        self._x = None
+        self._v = None
+        self._time = None
+        self._cov = None
+
+    def smooth(self, xy, timestamp):
+        if self._x is None:
+            self._x = np.array(xy, dtype=np.float64)
+            self._v = np.zeros_like(self._x)
+            self._time = timestamp
+            self._cov = (self.measurement_noise, 0.0, self.initial_velocity_var)
+            return self._x
+
+        dt = timestamp - self._time
+        if dt <= 0:
+            return self._x
+        self._time = timestamp
+
+        # Predict: x += v * dt, P = F P F' + Q for white-noise acceleration.
+        p_xx, p_xv, p_vv = self._cov
+        q = self.process_noise
+        p_xx += 2 * dt * p_xv + dt * dt * p_vv + q * dt ** 3 / 3
+        p_xv += dt * p_vv + q * dt * dt / 2
+        p_vv += q * dt
+        self._x += self._v * dt
+
+        # Update with the detection.
+        gain_x = p_xx / (p_xx + self.measurement_noise)
+        gain_v = p_xv / (p_xx + self.measurement_noise)
+        residual = xy - self._x
+        self._x += gain_x * residual
+        self._v += gain_v * residual
+        self._cov = ((1 - gain_x) * p_xx, (1 - gain_x) * p_xv, p_vv - gain_v * p_xv)
+        return self._x
+
+
+FILTERS = {
+    'ema': EmaFilter,
+    'one_euro': OneEuroFilter,
+    'kalman': KalmanFilter
+}
+
+
+def make_filter(smoothing):
+    """
+    A filter for `smoothing`: None, a name from FILTERS, a `(name, params)`
+    pair or a filter instance, which is used as it is.
+    """
+    if smoothing is None or hasattr(smoothing, 'smooth'):
+        return smoothing
+
+    if isinstance(smoothing, str):
+        name, params = smoothing, {}
+    else:
+        name, params = smoothing
+
+    if name not in FILTERS:
+        raise ValueError(f'Unknown smoothing filter {name!r}, expected one of {sorted(FILTERS)}')
+
+    return FILTERS[name](**params)
+
+
+def smooth_track(landmarks, timestamps, smoothing):
+    """
+    A copy of a (frames, 33, 4) landmark track with x and y filtered in
+    frame order, exactly as an Activity with the same `smoothing` filters
+    them live. Frames where nobody was detected (NaN) reset the filter.
+    """
+    smoother = make_filter(smoothing)
+    smoother.reset()
+
+    smoothed = np.array(landmarks, dtype=np.float32)
+    for idx, frame_landmarks in enumerate(smoothed):
+        if np.isnan(frame_landmarks[0, 0]):
+            smoother.reset()
+            continue
+
+        frame_landmarks[:, :2] = smoother.smooth(
+            frame_landmarks[:, :2], float(timestamps[idx]))
+
+    return smoothed
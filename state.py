@@ -0,0 +1,81 @@
+import numpy as np
+
+
+# Stages of a rep by code, 0 standing for none.
+STATES = (None, 's1', 's2', 's3')
+
+# The only rep sequences the state machine can build, by code, and the
+# sequence an s2 or s3 frame leads to from each. s1 leaves the sequence to
+# the counter, which clears it.
+SEQS = ((), ('s2',), ('s2', 's3'), ('s2', 's3', 's2'))
+SEQ_NEXT = {
+    's2': (1, 1, 3, 3),
+    's3': (0, 2, 2, 3)
+}
+
+# SEQ_COUNTS[seq][state] is SEQS[seq].count(state).
+SEQ_COUNTS = tuple({state: seq.count(state) for state in STATES} for seq in SEQS)
+
+SEQ_EMPTY = 0
+SEQ_S2 = 1
+SEQ_COMPLETE = 3
+
+
+class StateTracker:
+    """
+    Rep state of one Activity. Read and written many times per frame, so it
+    is a slotted object rather than a dict, and the rep sequence is a code
+    into SEQS instead of a list. The feedback arrays are allocated once and
+    cleared in place.
+    """
+
+    __slots__ = (
+        'seq',
+        'start_inactive_time_side',
+        'start_inactive_time_front',
+        'inactive_time_side',
+        'inactive_time_front',
+        'display_text',
+        'count_frames',
+        'incorrect_posture',
+        'prev_state',
+        'curr_state',
+        'correct_count',
+        'incorrect_count'
+    )
+
+    def __init__(self, feedback_count):
+        self.seq = SEQ_EMPTY
+
+        # Set on the first frame.
+        self.start_inactive_time_side = None
+        self.start_inactive_time_front = None
+        self.inactive_time_side = 0.0
+        self.inactive_time_front = 0.0
+
+        self.display_text = np.full((feedback_count,), False)
+        self.count_frames = np.zeros((feedback_count,), dtype=np.int64)
+
+        self.incorrect_posture = False
+
+        self.prev_state = None
+        self.curr_state = None
+
+        self.correct_count = 0
+        self.incorrect_count = 0
+
+    @property
+    def state_seq(self):
+        return list(SEQS[self.seq])
+
+    def update_seq(self, state):
+        next_seq = SEQ_NEXT.get(state)
+        if next_seq is not None:
+            self.seq = next_seq[self.seq]
+
+    def seq_count(self, state):
+        return SEQ_COUNTS[self.seq].get(state, 0)
+
+    def clear_feedback(self):
+        self.display_text.fill(False)
+        self.count_frames.fill(0)
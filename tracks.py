@@ -0,0 +1,149 @@
+import zipfile
+
+import numpy as np
+
+from utils import NUM_LANDMARKS
+
+
+# A landmark track is the raw pose estimator output of a clip, enough to
+# score it again without running MediaPipe. It is stored as an uncompressed
+# .npz holding:
+#
+#   'landmarks'   (frames, 33, 4) float32 normalized x, y, z and visibility,
+#                 NaN for frames where nobody was detected.
+#   'timestamps'  (frames,) float64 presentation time of each frame, seconds.
+#   'frame_size'  (2,) int64 frame width and height in pixels.
+#
+# Members are stored uncompressed, so `load_track(..., mmap_mode='r')` can map
+# the landmarks straight from the file instead of reading them in.
+
+
+class Track:
+    def __init__(self, landmarks, timestamps, frame_width, frame_height):
+        self.landmarks = landmarks
+        self.timestamps = timestamps
+        self.frame_width = int(frame_width)
+        self.frame_height = int(frame_height)
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    def save(self, path):
+        save_track(path, self.landmarks, self.timestamps,
+                   self.frame_width, self.frame_height)
+
+
+class TrackRecorder:
+    """
+    Collects the landmarks an Activity's pose estimator returns, one frame
+    at a time, into a buffer that doubles when full, so recording a long
+    session costs an amortized row copy per frame. Frames a FrameSkipper
+    extrapolated are not recorded.
+    """
+
+    def __init__(self, capacity=1024):
+        self._landmarks = np.empty(
+            (capacity, NUM_LANDMARKS, 4), dtype=np.float32)
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self.frames = 0
+        self.frame_width = 0
+        self.frame_height = 0
+
+    def __len__(self):
+        return self.frames
+
+    def _grow(self):
+        capacity = 2 * len(self._timestamps)
+
+        landmarks = np.empty((capacity, NUM_LANDMARKS, 4), dtype=np.float32)
+        landmarks[:self.frames] = self._landmarks[:self.frames]
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:self.frames] = self._timestamps[:self.frames]
+
+        self._landmarks = landmarks
+        self._timestamps = timestamps
+
+    def append(self, landmarks, timestamp, frame_width, frame_height):
+        """Record a frame; `landmarks` is a (33, 4) array or None."""
+        if self.frames == len(self._timestamps):
+            self._grow()
+
+        if landmarks is None:
+            self._landmarks[self.frames] = np.nan
+        else:
+            self._landmarks[self.frames] = landmarks
+
+        self._timestamps[self.frames] = timestamp
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.frames += 1
+
+    def clear(self):
+        self.frames = 0
+
+    def track(self):
+        """The frames recorded so far, as a Track of copies."""
+        return Track(self._landmarks[:self.frames].copy(),
+                     self._timestamps[:self.frames].copy(),
+                     self.frame_width, self.frame_height)
+
+    def save(self, path):
+        save_track(path, self._landmarks[:self.frames], self._timestamps[:self.frames],
+                   self.frame_width, self.frame_height)
+
+
+def save_track(path, landmarks, timestamps, frame_width, frame_height):
+    np.savez(
+        path,
+        landmarks=np.asarray(landmarks, dtype=np.float32),
+        timestamps=np.asarray(timestamps, dtype=np.float64),
+        frame_size=np.array([frame_width, frame_height], dtype=np.int64)
+    )
+
+
+def _map_member(path, name, mmap_mode):
+    # Memory-map one array of an uncompressed .npz: its .npy data starts
+    # right after the zip entry's local header and the .npy header.
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(name + '.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_len = int.from_bytes(local_header[26:28], 'little')
+        extra_len = int.from_bytes(local_header[28:30], 'little')
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if not shape or 0 in shape:
+        return None
+
+    return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_track(path, mmap_mode=None):
+    """
+    Read a track written by `save_track`. With `mmap_mode='r'` the landmarks
+    are memory-mapped rather than read, so opening a long clip is instant
+    and only the pages that are used get loaded.
+    """
+    with np.load(path) as data:
+        timestamps = data['timestamps']
+        frame_width, frame_height = data['frame_size'].tolist()
+
+        landmarks = None
+        if mmap_mode is not None:
+            landmarks = _map_member(path, 'landmarks', mmap_mode)
+        if landmarks is None:
+            landmarks = data['landmarks']
+
+    return Track(landmarks, timestamps, frame_width, frame_height)
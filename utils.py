@@ -1,7 +1,14 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import math
+from collections import namedtuple
+from types import SimpleNamespace
+
+
+# Number of landmarks in a MediaPipe pose result.
+NUM_LANDMARKS = 33
+
+Landmark = namedtuple('Landmark', ['x', 'y', 'z', 'visibility'])
 
 
 def draw_rounded_rect(img, rect_start, rect_end, corner_width, box_color):
@@ -92,6 +99,41 @@ def find_angle(p1, p2, ref_pt=np.array([0, 0])):
     return int(degree)
 
 
+def find_angles(p1, p2, ref_pt, exact=False):
+    """
+    Batched `find_angle`: the angle at `ref_pt` between `p1` and `p2` for
+    stacked points of shape (..., 2), such as the (N, 2) triplets one frame
+    needs or a (frames, joints, 2) landmark tensor for a whole clip.
+
+    By default every element equals what `find_angle` returns for the same
+    points, including its `int(180 / np.pi)` scale factor (57, not 57.29...)
+    and the truncation to int. `exact=True` returns true float64 degrees
+    instead. Degenerate triplets, where `p1` or `p2` sits on `ref_pt` and
+    `find_angle` would raise, give 0.
+    """
+    p1_ref = np.subtract(p1, ref_pt, dtype=np.float64)
+    p2_ref = np.subtract(p2, ref_pt, dtype=np.float64)
+
+    prod = p1_ref * p2_ref
+    p1_sq = p1_ref * p1_ref
+    p2_sq = p2_ref * p2_ref
+
+    # Same operations, in the same order, as np.dot / np.linalg.norm on the
+    # 2-vectors, so results are bit-identical to the scalar version.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos_theta = (prod[..., 0] + prod[..., 1]) / \
+            (np.sqrt(p1_sq[..., 0] + p1_sq[..., 1]) * np.sqrt(p2_sq[..., 0] + p2_sq[..., 1]))
+        theta = np.arccos(np.minimum(np.maximum(cos_theta, -1.0), 1.0))
+
+    # fmax drops the NaN of degenerate triplets; valid angles are >= 0.
+    theta = np.fmax(theta, 0.0)
+
+    if exact:
+        return np.degrees(theta)
+
+    return (int(180 / np.pi) * theta).astype(np.int64)
+
+
 def find_dist(p1, p2):
     dist = math.sqrt((p2[0]-p1[0])**2+(p2[1]-p1[1])**2)
     return dist
@@ -140,6 +182,59 @@ def get_landmark_features(kp_results, dict_features, feature, frame_width, frame
         raise ValueError("feature needs to be either 'nose', 'left' or 'right")
 
 
+def get_landmark_buffer(pose_landmark, out=None):
+    # Copy all landmarks into one (33, 4) float32 array of normalized
+    # x, y, z and visibility, reusing `out` when given.
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+
+    out.reshape(-1)[:] = [
+        v for lm in pose_landmark for v in (lm.x, lm.y, lm.z, lm.visibility)]
+
+    return out
+
+
+def scale_landmarks(landmarks, frame_size, out=None):
+    """
+    Pixel coordinates of every landmark in one vectorized operation.
+
+    `frame_size` is `(frame_width, frame_height)`. The products are taken in
+    float64 and truncated toward zero, exactly like `get_landmark_array`, so
+    both paths give the same pixels. `out` is an optional (33, 2) int64 array
+    to write into.
+    """
+    if out is None:
+        out = np.empty((len(landmarks), 2), dtype=np.int64)
+
+    return np.multiply(landmarks[:, :2], frame_size, out=out,
+                       dtype=np.float64, casting='unsafe')
+
+
+class PoseResult:
+    """
+    Array-backed stand-in for the result of `pose.process(frame)`, used to
+    feed stored landmarks back through `Activity` without running MediaPipe.
+    """
+
+    def __init__(self, landmarks=None):
+        # (33, 4) array as returned by `get_landmark_buffer`, or None when no
+        # person was detected.
+        self.landmarks = landmarks
+        self._pose_landmarks = None
+
+    @property
+    def pose_landmarks(self):
+        if self.landmarks is None:
+            return None
+
+        if self._pose_landmarks is None:
+            # tolist() yields Python floats, exactly like the protobuf fields.
+            self._pose_landmarks = SimpleNamespace(
+                landmark=[Landmark(*row) for row in self.landmarks.tolist()])
+
+        return self._pose_landmarks
+
+
 def get_mediapipe_pose(
     static_image_mode=False,
     model_complexity=1,
@@ -148,6 +243,10 @@ def get_mediapipe_pose(
     min_tracking_confidence=0.5
 
 ):
+    # MediaPipe takes longer to import than everything else together, so it
+    # is only loaded once a model is actually needed.
+    import mediapipe as mp
+
     pose = mp.solutions.pose.Pose(
         static_image_mode=static_image_mode,
         model_complexity=model_complexity,